@@ -10,6 +10,9 @@ class Settings(BaseSettings):
     APP_NAME: str = "Chat App Backend"
     MONGO_URI: AnyUrl = os.getenv("MONGO_URI")
     MONGO_DB_NAME: str = os.getenv("MONGO_DB_NAME")
+    MONGO_ENSURE_INDEXES: bool = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+    # Data backfills at startup (also runnable as: python -m app.core.migrations)
+    MONGO_RUN_MIGRATIONS: bool = os.getenv("MONGO_RUN_MIGRATIONS", "true").lower() == "true"
 
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
@@ -19,6 +22,83 @@ class Settings(BaseSettings):
     CLOUDINARY_API_KEY: str = os.getenv("CLOUDINARY_API_KEY")
     CLOUDINARY_API_SECRET: str = os.getenv("CLOUDINARY_API_SECRET")
 
+    # Media uploads: "cloudinary" or "local" (files under UPLOAD_DIR, served at UPLOAD_URL_PATH)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "cloudinary")
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "static/uploads")
+    UPLOAD_URL_PATH: str = os.getenv("UPLOAD_URL_PATH", "/static/uploads")
+    UPLOAD_PUBLIC_BASE_URL: str = os.getenv("UPLOAD_PUBLIC_BASE_URL", "")
+    MEDIA_VARIANT_WORKERS: int = int(os.getenv("MEDIA_VARIANT_WORKERS", 2))
+    # Recently stored upload keys -> URL, so repeat uploads skip the storage call
+    UPLOAD_KEY_CACHE_TTL_SECONDS: int = int(os.getenv("UPLOAD_KEY_CACHE_TTL_SECONDS", 3600))
+    UPLOAD_KEY_CACHE_MAX_ENTRIES: int = int(os.getenv("UPLOAD_KEY_CACHE_MAX_ENTRIES", 10_000))
+
+    # WebSocket fan-out backplane: "memory" (single worker), "redis" or "local"
+    WS_BACKPLANE: str = os.getenv("WS_BACKPLANE", "memory")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # Per-connection outbound queue: "drop_oldest", "coalesce" or "disconnect"
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+    WS_OVERFLOW_POLICY: str = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+
+    # Room membership cache (authorization on every WebSocket action)
+    ROOM_CACHE_TTL_SECONDS: int = int(os.getenv("ROOM_CACHE_TTL_SECONDS", 300))
+    ROOM_CACHE_MAX_ENTRIES: int = int(os.getenv("ROOM_CACHE_MAX_ENTRIES", 50_000))
+    # Pair -> direct room; direct rooms never change membership, so this can be long-lived
+    DIRECT_ROOM_CACHE_TTL_SECONDS: int = int(os.getenv("DIRECT_ROOM_CACHE_TTL_SECONDS", 3600))
+    DIRECT_ROOM_CACHE_MAX_ENTRIES: int = int(os.getenv("DIRECT_ROOM_CACHE_MAX_ENTRIES", 50_000))
+
+    # Presence: diffs are pushed once per tick; sockets silent for the idle
+    # timeout are reaped (0 disables); workers that stop heartbeating are
+    # considered gone after the worker TTL
+    PRESENCE_TICK_MS: int = int(os.getenv("PRESENCE_TICK_MS", 1000))
+    PRESENCE_IDLE_TIMEOUT_SECONDS: int = int(os.getenv("PRESENCE_IDLE_TIMEOUT_SECONDS", 75))
+    PRESENCE_WORKER_TTL_SECONDS: int = int(os.getenv("PRESENCE_WORKER_TTL_SECONDS", 30))
+
+    # Typing indicators: aggregated per room every tick, expire after TTL
+    TYPING_TICK_MS: int = int(os.getenv("TYPING_TICK_MS", 250))
+    TYPING_TTL_MS: int = int(os.getenv("TYPING_TTL_MS", 3000))
+    TYPING_RATE_PER_SEC: float = float(os.getenv("TYPING_RATE_PER_SEC", 5))
+    TYPING_BURST: int = int(os.getenv("TYPING_BURST", 10))
+
+    # Write-behind message ingestion: "buffered" or "acknowledged"
+    MESSAGE_WRITE_MODE: str = os.getenv("MESSAGE_WRITE_MODE", "buffered")
+    MESSAGE_WRITE_BATCH_SIZE: int = int(os.getenv("MESSAGE_WRITE_BATCH_SIZE", 100))
+    MESSAGE_WRITE_FLUSH_MS: int = int(os.getenv("MESSAGE_WRITE_FLUSH_MS", 50))
+    # Writes of a buffered message before it is logged and dropped
+    MESSAGE_WRITE_MAX_ATTEMPTS: int = int(os.getenv("MESSAGE_WRITE_MAX_ATTEMPTS", 5))
+    READ_RECEIPT_FLUSH_MS: int = int(os.getenv("READ_RECEIPT_FLUSH_MS", 500))
+
+    # Recent-message ring buffers (history page one served from memory)
+    RECENT_MESSAGES_PER_ROOM: int = int(os.getenv("RECENT_MESSAGES_PER_ROOM", 100))
+    RECENT_MESSAGES_MAX_TOTAL: int = int(os.getenv("RECENT_MESSAGES_MAX_TOTAL", 200_000))
+
+    # Prometheus metrics at /metrics; when off, no instrumentation is installed at all.
+    # Scrapers must send "Authorization: Bearer <METRICS_TOKEN>"; with no token set
+    # the endpoint is only answered for loopback clients.
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    METRICS_TOKEN: str | None = os.getenv("METRICS_TOKEN")
+
+    # Authenticated-user cache used by get_current_user
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10_000))
+
+    # Friend-of-friend suggestions are recomputed at most this often per user,
+    # and cached for at most this many users
+    FRIEND_SUGGESTIONS_TTL_SECONDS: int = int(os.getenv("FRIEND_SUGGESTIONS_TTL_SECONDS", 300))
+    FRIEND_SUGGESTIONS_MAX: int = int(os.getenv("FRIEND_SUGGESTIONS_MAX", 50))
+    FRIEND_SUGGESTIONS_CACHE_MAX_ENTRIES: int = int(os.getenv("FRIEND_SUGGESTIONS_CACHE_MAX_ENTRIES", 10_000))
+
+    # User autocomplete: candidates fetched per prefix, and how long a prefix's results are reused
+    USER_SEARCH_CANDIDATES: int = int(os.getenv("USER_SEARCH_CANDIDATES", 50))
+    USER_SEARCH_CACHE_TTL_SECONDS: int = int(os.getenv("USER_SEARCH_CACHE_TTL_SECONDS", 30))
+    USER_SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_SEARCH_CACHE_MAX_ENTRIES", 2048))
+
+    # Argon2 hashing pool: "thread" or "process"
+    HASH_POOL_KIND: str = os.getenv("HASH_POOL_KIND", "thread")
+    HASH_POOL_WORKERS: int = int(os.getenv("HASH_POOL_WORKERS", 4))
+    HASH_MAX_CONCURRENCY: int = int(os.getenv("HASH_MAX_CONCURRENCY", 4))
+
     class Config:
         env_file = ".env"
 
@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from .config import settings
+from .metrics import db_event_listeners
 
 _client: AsyncIOMotorClient | None = None
 
@@ -7,7 +8,7 @@ _client: AsyncIOMotorClient | None = None
 def get_client() -> AsyncIOMotorClient:
     global _client
     if _client is None:
-        _client = AsyncIOMotorClient(str(settings.MONGO_URI))
+        _client = AsyncIOMotorClient(str(settings.MONGO_URI), event_listeners=db_event_listeners())
     return _client
 
 
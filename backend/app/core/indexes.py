@@ -0,0 +1,180 @@
+"""
+Index declarations for the chat collections.
+
+ensure_indexes() runs at startup and is idempotent: create_indexes is a
+no-op for indexes that already exist with the same spec.
+
+verify_query_plans() explains every hot model query and reports the ones
+whose winning plan still contains a COLLSCAN. Run it against a database
+with the indexes in place:
+
+    python -m app.core.indexes --verify
+"""
+import asyncio
+import logging
+import sys
+from typing import Any, Dict, List
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.core.database import get_database
+from app.models.chat_model import MESSAGES_COLLECTION, READS_COLLECTION, ROOMS_COLLECTION
+from app.models.user_model import USERS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    MESSAGES_COLLECTION: [
+        # find_messages_for_room / iter_messages_for_room: equality on room_id,
+        # keyset over (created_at, _id) in either direction
+        IndexModel(
+            [("room_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="room_id_created_at_id",
+        ),
+        # refresh_unread_counts: messages after a read watermark
+        IndexModel([("room_id", ASCENDING), ("_id", ASCENDING)], name="room_id_id"),
+        # search_messages_in_rooms. Mongo keeps it current on every insert,
+        # edit and delete. room_id is a suffix key (a prefix would demand an
+        # equality match, ruling out $in over the caller's rooms), so the
+        # room filter is applied inside the index before documents are fetched.
+        IndexModel([("content", TEXT), ("room_id", ASCENDING)], name="content_text_room_id"),
+    ],
+    ROOMS_COLLECTION: [
+        # find_rooms_for_user / find_room_summaries_for_user (sorted by activity)
+        IndexModel(
+            [("participants", ASCENDING), ("last_activity_at", DESCENDING), ("_id", DESCENDING)],
+            name="participants_last_activity_at",
+        ),
+        # upsert_direct_room: one direct room per pair of users. Partial, so
+        # group rooms (which have no pair_key) are not indexed at all.
+        IndexModel(
+            [("pair_key", ASCENDING)],
+            name="pair_key_unique",
+            unique=True,
+            partialFilterExpression={"pair_key": {"$type": "string"}},
+        ),
+    ],
+    READS_COLLECTION: [
+        # advance_read_watermarks upserts on this pair; find_read_watermarks uses the prefix
+        IndexModel([("room_id", ASCENDING), ("user_id", ASCENDING)], name="room_id_user_id", unique=True),
+    ],
+    USERS_COLLECTION: [
+        # find_user_by_email; also guarantees one account per address
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # find_users_by_prefix: range scan, already in result order
+        IndexModel([("username_lower", ASCENDING)], name="username_lower"),
+        # find_users_by_trigrams (multikey)
+        IndexModel([("username_trigrams", ASCENDING)], name="username_trigrams"),
+    ],
+}
+
+
+async def ensure_indexes():
+    db = get_database()
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. an equivalent index exists under another name, or existing
+            # duplicates block a unique index. Don't take the app down for it.
+            logger.error("Could not create indexes on %s: %s", collection, e)
+
+
+def _hot_queries() -> List[Dict[str, Any]]:
+    room_id = ObjectId()
+    user_id = str(ObjectId())
+    other_id = str(ObjectId())
+    return [
+        {
+            "name": "find_messages_for_room",
+            "collection": MESSAGES_COLLECTION,
+            "filter": {"room_id": room_id},
+            "sort": [("created_at", DESCENDING), ("_id", DESCENDING)],
+        },
+        {
+            "name": "search_messages_in_rooms",
+            "collection": MESSAGES_COLLECTION,
+            "filter": {"$text": {"$search": "hello"}, "room_id": {"$in": [room_id]}},
+        },
+        {
+            "name": "find_rooms_for_user",
+            "collection": ROOMS_COLLECTION,
+            "filter": {"participants": user_id},
+        },
+        {
+            "name": "find_room_summaries_for_user",
+            "collection": ROOMS_COLLECTION,
+            "filter": {"participants": user_id},
+            "sort": [("last_activity_at", DESCENDING), ("_id", DESCENDING)],
+        },
+        {
+            "name": "find_unread_counts",
+            "collection": READS_COLLECTION,
+            "filter": {"user_id": user_id, "room_id": {"$in": [room_id]}},
+        },
+        {
+            "name": "upsert_direct_room",
+            "collection": ROOMS_COLLECTION,
+            "filter": {"pair_key": ":".join(sorted((user_id, other_id)))},
+        },
+        {
+            "name": "find_user_by_email",
+            "collection": USERS_COLLECTION,
+            "filter": {"email": "someone@example.com"},
+        },
+        {
+            "name": "find_users_by_prefix",
+            "collection": USERS_COLLECTION,
+            "filter": {"username_lower": {"$gte": "ali", "$lt": "alj"}},
+            "sort": [("username_lower", ASCENDING)],
+        },
+        {
+            "name": "find_users_by_trigrams",
+            "collection": USERS_COLLECTION,
+            "filter": {"username_trigrams": {"$in": ["ali", "lic", "ice"]}},
+        },
+    ]
+
+
+def _stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+    # SBE plans (MongoDB 5+) nest the classic tree under queryPlan
+    if "queryPlan" in plan:
+        yield from _stages(plan["queryPlan"])
+
+
+async def verify_query_plans() -> List[str]:
+    """Return the names of hot queries that fall back to a collection scan."""
+    db = get_database()
+    offenders = []
+    for query in _hot_queries():
+        cursor = db[query["collection"]].find(query["filter"])
+        if "sort" in query:
+            cursor = cursor.sort(query["sort"])
+        explain = await cursor.limit(1).explain()
+        winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in set(_stages(winning)):
+            offenders.append(query["name"])
+    return offenders
+
+
+async def _main(verify: bool) -> int:
+    await ensure_indexes()
+    if not verify:
+        return 0
+    offenders = await verify_query_plans()
+    for name in offenders:
+        print(f"COLLSCAN: {name}")
+    if not offenders:
+        print("All hot queries use an index.")
+    return 1 if offenders else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main("--verify" in sys.argv)))
@@ -0,0 +1,257 @@
+"""
+Prometheus text-format metrics, served at /metrics.
+
+Deliberately dependency-free and small: counters, histograms, and gauges
+(or running totals kept elsewhere) read from a callback at scrape time.
+With METRICS_ENABLED=false nothing is installed: timed() hands back the
+undecorated function, the HTTP middleware and the Mongo command listener
+are never registered, and the few inline observations are guarded by
+`enabled`.
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+from app.core.config import settings
+
+enabled: bool = settings.METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+FANOUT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric"):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Observations may come from driver threads (see DbCommandListener).
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _labels(self, values: Tuple[str, ...]) -> List[Tuple[str, str]]:
+        return list(zip(self.labelnames, values))
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + [("le", _format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Gauge(_Metric):
+    """Read at scrape time, so keeping it current costs nothing on the hot path."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def samples(self):
+        yield self.name, [], self.fn()
+
+
+class CallbackCounter(Gauge):
+    """A running total kept elsewhere (e.g. a cache's hit count), read at scrape time."""
+
+    kind = "counter"
+
+
+# --- Shared metrics ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "chatsphere_http_request_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+)
+MODEL_CALL_SECONDS = Histogram(
+    "chatsphere_model_call_seconds", "Latency of model-layer functions.", ("function",)
+)
+DB_COMMANDS = Counter(
+    "chatsphere_db_commands_total", "MongoDB commands (round trips) issued.", ("command", "outcome")
+)
+DB_COMMAND_SECONDS = Histogram(
+    "chatsphere_db_command_seconds", "MongoDB command round-trip time.", ("command",)
+)
+
+
+def timed(histogram: Histogram, *labelvalues: str):
+    """Decorator observing call latency; returns the function untouched when metrics are off."""
+
+    def decorate(fn):
+        if not enabled or inspect.isasyncgenfunction(fn):
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, *labelvalues)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labelvalues)
+
+        return wrapper
+
+    return decorate
+
+
+def model_call(fn):
+    """Time a model-layer function under its module-qualified name, e.g. "chat_model.insert_room"."""
+    module = fn.__module__.rsplit(".", 1)[-1]
+    return timed(MODEL_CALL_SECONDS, f"{module}.{fn.__name__}")(fn)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP latency per route template (not per raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status))
+
+
+class DbCommandListener(monitoring.CommandListener):
+    """Counts every command the driver sends, i.e. actual round trips rather than API calls."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        DB_COMMANDS.inc(event.command_name, "ok")
+        DB_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        DB_COMMANDS.inc(event.command_name, "error")
+        DB_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+
+def db_event_listeners() -> list:
+    return [DbCommandListener()] if enabled else []
+
+
+def render() -> str:
+    return REGISTRY.render()
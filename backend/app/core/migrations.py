@@ -0,0 +1,136 @@
+"""
+Idempotent data backfills run at startup (MONGO_RUN_MIGRATIONS), after
+ensure_indexes(). Deployments that manage indexes themselves can turn
+MONGO_ENSURE_INDEXES off and still get these; the pair-key backfill
+relies on the pair_key_unique index to skip duplicate direct rooms, so
+create indexes first there. To run them by hand:
+
+    python -m app.core.migrations
+
+Each step only touches documents that are missing the field it adds, so
+running it on every boot is cheap once the data has been migrated.
+"""
+import asyncio
+import logging
+import sys
+
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.core.database import get_database
+from app.models.chat_model import (
+    MESSAGES_COLLECTION,
+    MESSAGE_PROJECTION,
+    READS_COLLECTION,
+    ROOMS_COLLECTION,
+    direct_pair_key,
+    init_read_states,
+    message_preview,
+)
+from app.models.user_model import USERS_COLLECTION, username_search_fields
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_room_summaries():
+    """Rooms created before summaries existed: last message and per-participant unread counters."""
+    db = get_database()
+    rooms, messages, reads = db[ROOMS_COLLECTION], db[MESSAGES_COLLECTION], db[READS_COLLECTION]
+
+    migrated = 0
+    async for room in rooms.find({"last_activity_at": {"$exists": False}}, {"participants": 1}):
+        room_id = room["_id"]
+        newest = await messages.find_one(
+            {"room_id": room_id}, MESSAGE_PROJECTION, sort=[("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+
+        participants = room.get("participants", [])
+        have_state = {
+            d["user_id"] async for d in reads.find({"room_id": room_id, "user_id": {"$in": participants}}, {"user_id": 1})
+        }
+        missing = [p for p in participants if p not in have_state]
+        unread = {}
+        if newest is not None and missing:
+            # Nobody has a watermark yet, so everything sent by others is unread.
+            total = await messages.count_documents({"room_id": room_id})
+            by_sender = messages.aggregate([
+                {"$match": {"room_id": room_id}},
+                {"$group": {"_id": "$sender_id", "count": {"$sum": 1}}},
+            ])
+            sent = {str(d["_id"]): d["count"] async for d in by_sender}
+            unread = {p: total - sent.get(p, 0) for p in missing}
+        await init_read_states(str(room_id), missing, unread)
+
+        await rooms.update_one(
+            {"_id": room_id},
+            {"$set": {
+                "last_message": message_preview(newest) if newest else None,
+                "last_activity_at": newest["created_at"] if newest else None,
+            }},
+        )
+        migrated += 1
+
+    if migrated:
+        logger.info("Backfilled room summaries for %d rooms", migrated)
+
+
+async def backfill_username_search():
+    """Users created before prefix search: normalized username and its trigrams."""
+    users = get_database()[USERS_COLLECTION]
+    batch, migrated = [], 0
+    async for user in users.find({"username_lower": {"$exists": False}}, {"username": 1}):
+        batch.append(UpdateOne({"_id": user["_id"]}, {"$set": username_search_fields(user["username"])}))
+        if len(batch) >= 500:
+            await users.bulk_write(batch, ordered=False)
+            migrated += len(batch)
+            batch = []
+    if batch:
+        await users.bulk_write(batch, ordered=False)
+        migrated += len(batch)
+
+    if migrated:
+        logger.info("Backfilled username search fields for %d users", migrated)
+
+
+async def backfill_direct_pair_keys():
+    """Direct rooms created before pair keys. Oldest room per pair wins; later duplicates stay unkeyed."""
+    rooms = get_database()[ROOMS_COLLECTION]
+    migrated = duplicates = 0
+    query = {"is_group": False, "pair_key": {"$exists": False}, "participants": {"$size": 2}}
+    async for room in rooms.find(query, {"participants": 1}).sort("_id", 1):
+        try:
+            await rooms.update_one(
+                {"_id": room["_id"]}, {"$set": {"pair_key": direct_pair_key(*room["participants"])}}
+            )
+            migrated += 1
+        except DuplicateKeyError:
+            duplicates += 1
+
+    if migrated:
+        logger.info("Backfilled pair keys for %d direct rooms", migrated)
+    if duplicates:
+        logger.warning("%d duplicate direct rooms left without a pair key", duplicates)
+
+
+MIGRATIONS = [
+    backfill_room_summaries,
+    backfill_username_search,
+    backfill_direct_pair_keys,
+]
+
+
+async def run_migrations() -> int:
+    """Run every migration, returning how many failed."""
+    failed = 0
+    for migration in MIGRATIONS:
+        try:
+            await migration()
+        except Exception:
+            failed += 1
+            logger.exception("Migration %s failed", migration.__name__)
+    return failed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(1 if asyncio.run(run_migrations()) else 0)
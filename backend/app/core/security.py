@@ -3,7 +3,7 @@ from fastapi.security import OAuth2PasswordBearer
 
 from app.utils.jwt import decode_token
 from app.schemas.user_schema import TokenData, UserInDB
-from app.services.user_service import get_user_by_id
+from app.services.user_cache import user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -23,15 +23,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
             detail="Invalid token data",
         )
 
-    user = await get_user_by_id(token_data.user_id)
+    # --- Cached lookup: most requests need no DB read ---
+    token_salt = payload.get("lid") # Get login ID from token
+    user = user_cache.get(token_data.user_id)
+    if user is None or (token_salt is not None and token_salt != user.last_login_salt):
+        # Miss, or the cached copy predates a newer login: confirm against the DB.
+        user = await user_cache.load(token_data.user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
     # --- NEW: Session Check ---
-    token_salt = payload.get("lid") # Get login ID from token
-    
     if token_salt is None or token_salt != user.last_login_salt:
         # This occurs if the token is old/revoked by a newer login
         raise HTTPException(
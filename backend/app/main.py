@@ -4,14 +4,24 @@ from fastapi.staticfiles import StaticFiles
 import os
 
 from app.core.config import settings
-from app.routers import auth_router, user_router, chat_router
+from app.core.metrics import MetricsMiddleware
+from app.core.indexes import ensure_indexes
+from app.core.migrations import run_migrations
+from app.routers import auth_router, user_router, chat_router, metrics_router
 from app.websocket import chat_ws
-
-#os.makedirs("static/uploads", exist_ok=True)
+from app.services.message_ingestor import message_ingestor
+from app.services.message_cache import message_cache
+from app.services.read_receipts import read_receipts
+from app.services.user_cache import user_cache
+from app.services.room_cache import room_members
+from app.utils.hashing import shutdown_hash_pool
+from app.services.media_service import shutdown_media_pool
 
 app = FastAPI(title=settings.APP_NAME)
 
-#app.mount("/static", StaticFiles(directory="static"), name="static")
+if settings.STORAGE_BACKEND == "local":
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    app.mount(settings.UPLOAD_URL_PATH, StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 # CORS
 
 # --- FIXED CORS SETUP ---
@@ -31,6 +41,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Prev-Cursor", "X-Next-Cursor"],
 )
 
 # Routers
@@ -39,6 +50,38 @@ app.include_router(user_router.router)
 app.include_router(chat_router.router)
 app.include_router(chat_ws.router)
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router.router)
+
+
+@app.on_event("startup")
+async def startup():
+    if settings.MONGO_ENSURE_INDEXES:
+        await ensure_indexes()
+    if settings.MONGO_RUN_MIGRATIONS:
+        await run_migrations()
+    await chat_ws.manager.start()
+    await message_cache.start()
+    await user_cache.start()
+    await room_members.start()
+    await chat_ws.typing_coordinator.start()
+    await chat_ws.presence.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await chat_ws.presence.stop()
+    await chat_ws.typing_coordinator.stop()
+    await room_members.stop()
+    await user_cache.stop()
+    await message_cache.stop()
+    await chat_ws.manager.stop()
+    await read_receipts.stop()
+    await message_ingestor.stop()
+    shutdown_hash_pool()
+    await shutdown_media_pool()
+
 
 @app.get("/")
 async def root():
@@ -1,11 +1,24 @@
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from bson import ObjectId
 from datetime import datetime
+import asyncio
+import base64
+import json
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from app.core.database import get_database
+from app.core.metrics import model_call
 
 ROOMS_COLLECTION = "chat_rooms"
 MESSAGES_COLLECTION = "chat_messages"
+READS_COLLECTION = "room_reads"  # one read watermark per (room, user)
+
+# read_by is legacy (superseded by READS_COLLECTION); keep old arrays off the wire.
+MESSAGE_PROJECTION = {"read_by": 0}
+
+# Length of the denormalized last-message preview stored on each room
+PREVIEW_CHARS = 120
 
 
 def room_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
@@ -23,6 +36,7 @@ def message_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
         "room_id": str(doc["room_id"]),
         "sender_id": str(doc["sender_id"]),
         "image_url": doc.get("image_url"),
+        "image_variants": doc.get("image_variants"),
         "content": doc["content"],
         "created_at": doc["created_at"],
         "updated_at": doc.get("updated_at"),
@@ -39,107 +53,38 @@ async def get_message_collection():
     return db[MESSAGES_COLLECTION]
 
 
-async def insert_room(name: str | None, is_group: bool, participants: List[str]):
-    col = await get_room_collection()
-    result = await col.insert_one(
-        {
-            "name": name,
-            "is_group": is_group,
-            "participants": participants,
-        }
-    )
-    new_doc = await col.find_one({"_id": result.inserted_id})
-    return room_helper(new_doc)
-
-
-async def find_room_by_id(room_id: str):
-    col = await get_room_collection()
-    try:
-        oid = ObjectId(room_id)
-    except Exception:
-        return None
-    doc = await col.find_one({"_id": oid})
-    return room_helper(doc) if doc else None
-
-
-async def find_direct_room(user1_id: str, user2_id: str):
-    col = await get_room_collection()
-    participants_set = {user1_id, user2_id}
-    doc = await col.find_one(
-        {"is_group": False, "participants": {"$all": list(participants_set), "$size": 2}}
-    )
-    return room_helper(doc) if doc else None
+def room_summary_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
+    summary = room_helper(doc)
+    summary["last_message"] = doc.get("last_message")
+    summary["last_activity_at"] = doc.get("last_activity_at")
+    return summary
 
 
-async def insert_message(room_id: str, sender_id: str, content: str, image_url: str  = None):
-    col = await get_message_collection()
-    now = datetime.utcnow()
-    result = await col.insert_one(
-        {
-            "room_id": ObjectId(room_id),
-            "sender_id": ObjectId(sender_id),
-            "content": content,
-            "image_url": image_url,
-            "created_at": now,
-            "updated_at": None,
-        }
-    )
-    new_doc = await col.find_one({"_id": result.inserted_id})
-    return message_helper(new_doc)
-
-#--- NEW FUNCTION ADDED ---
-from typing import Any, Dict, List
-from bson import ObjectId
-from datetime import datetime
-from app.core.database import get_database
-
-# ... existing constants and room_helper ...
-ROOMS_COLLECTION = "chat_rooms"
-MESSAGES_COLLECTION = "chat_messages"
-
-def room_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
+def message_preview(doc: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "id": str(doc["_id"]),
-        "name": doc.get("name"),
-        "is_group": doc.get("is_group", False),
-        "participants": doc.get("participants", []),
-    }
-
-def message_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        "id": str(doc["_id"]),
-        "room_id": str(doc["room_id"]),
         "sender_id": str(doc["sender_id"]),
-        "image_url": doc.get("image_url"),
-        "content": doc["content"],
+        "content": (doc.get("content") or "")[:PREVIEW_CHARS],
+        "has_image": bool(doc.get("image_url")),
         "created_at": doc["created_at"],
-        "updated_at": doc.get("updated_at"), # Add this
     }
 
-# ... get_room_collection, get_message_collection ...
-async def get_room_collection():
-    db = get_database()
-    return db[ROOMS_COLLECTION]
 
-
-async def get_message_collection():
-    db = get_database()
-    return db[MESSAGES_COLLECTION]
-
-# ... insert_room, find_room_by_id, find_direct_room ...
+@model_call
 async def insert_room(name: str | None, is_group: bool, participants: List[str]):
     col = await get_room_collection()
-    result = await col.insert_one(
-        {
-            "name": name,
-            "is_group": is_group,
-            "participants": participants,
-        }
-    )
-    new_doc = await col.find_one({"_id": result.inserted_id})
-    return room_helper(new_doc)
+    doc = {
+        "name": name,
+        "is_group": is_group,
+        "participants": participants,
+    }
+    result = await col.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    await init_read_states(str(doc["_id"]), participants)
+    return room_helper(doc)
 
 
+@model_call
 async def find_room_by_id(room_id: str):
     col = await get_room_collection()
     try:
@@ -150,96 +95,531 @@ async def find_room_by_id(room_id: str):
     return room_helper(doc) if doc else None
 
 
-async def find_direct_room(user1_id: str, user2_id: str):
+@model_call
+async def find_room_participants(room_id: str) -> Optional[List[str]]:
+    """Participant ids only (for membership checks), or None if the room doesn't exist."""
     col = await get_room_collection()
-    participants_set = {user1_id, user2_id}
-    doc = await col.find_one(
-        {"is_group": False, "participants": {"$all": list(participants_set), "$size": 2}}
-    )
-    return room_helper(doc) if doc else None
+    try:
+        oid = ObjectId(room_id)
+    except Exception:
+        return None
+    doc = await col.find_one({"_id": oid}, {"participants": 1})
+    return doc.get("participants", []) if doc else None
 
-async def insert_message(room_id: str, sender_id: str, content: str, image_url: str = None):
+
+def direct_pair_key(user1_id: str, user2_id: str) -> str:
+    """Canonical key for a direct room: the same for (a, b) and (b, a)."""
+    return ":".join(sorted((user1_id, user2_id)))
+
+
+@model_call
+async def upsert_direct_room(user1_id: str, user2_id: str) -> Dict[str, Any]:
+    """
+    The direct room for a pair of users, created if missing, in one indexed
+    upsert on pair_key. The unique index makes concurrent creates converge
+    on a single room instead of producing duplicates.
+    """
+    col = await get_room_collection()
+    key = direct_pair_key(user1_id, user2_id)
+    new_id = ObjectId()
+    update = {"$setOnInsert": {
+        "_id": new_id,
+        "name": None,
+        "is_group": False,
+        "participants": [user1_id, user2_id],
+        "pair_key": key,
+    }}
+    try:
+        doc = await col.find_one_and_update(
+            {"pair_key": key}, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost a race with a concurrent upsert of the same pair; it exists now.
+        doc = await col.find_one({"pair_key": key})
+    if doc["_id"] == new_id:
+        await init_read_states(str(new_id), doc["participants"])
+    return room_helper(doc)
+
+
+@model_call
+async def insert_message(room_id: str, sender_id: str, content: str, image_url: str  = None):
     col = await get_message_collection()
+    doc = build_message_doc(room_id, sender_id, content, image_url)
+    await col.insert_one(doc)
+    return message_helper(doc)
+
+
+def build_message_doc(
+    room_id: str,
+    sender_id: str,
+    content: str,
+    image_url: str = None,
+    image_variants: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Message document with _id and timestamp assigned locally, ready to insert."""
     now = datetime.utcnow()
-    result = await col.insert_one(
-        {
-            "room_id": ObjectId(room_id),
-            "sender_id": ObjectId(sender_id),
-            "content": content,
-            "image_url": image_url,
-            "created_at": now,
-            "updated_at": None # Initialize as None
+    return {
+        "_id": ObjectId(),
+        "room_id": ObjectId(room_id),
+        "sender_id": ObjectId(sender_id),
+        "content": content,
+        "image_url": image_url,
+        "image_variants": image_variants,
+        # BSON dates are millisecond precision; truncate so the value we hand
+        # out (and build cursors from) is exactly what Mongo stores.
+        "created_at": now.replace(microsecond=now.microsecond // 1000 * 1000),
+        "updated_at": None,
+    }
+
+
+@model_call
+async def insert_messages(docs: List[Dict[str, Any]]):
+    """Insert prebuilt message documents in one round trip. Returns the ids written."""
+    col = await get_message_collection()
+    try:
+        await col.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate _id means an earlier attempt already wrote the document.
+        failed = {
+            err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000
         }
-    )
-    new_doc = await col.find_one({"_id": result.inserted_id})
-    return message_helper(new_doc)
+        if failed:
+            raise
+    return [doc["_id"] for doc in docs]
 
 # --- NEW FUNCTIONS ---
 
-async def update_message(message_id: str, content: str):
+@model_call
+async def update_message(message_id: str, content: str, sender_id: str | None = None):
+    """Update content in one round trip. With sender_id, only the author's message matches."""
     col = await get_message_collection()
     now = datetime.utcnow()
     try:
-        oid = ObjectId(message_id)
+        query = {"_id": ObjectId(message_id)}
+        if sender_id is not None:
+            query["sender_id"] = ObjectId(sender_id)
     except:
         return None
         
     result = await col.find_one_and_update(
-        {"_id": oid},
+        query,
         {"$set": {"content": content, "updated_at": now}},
+        projection=MESSAGE_PROJECTION,
         return_document=True
     )
     return message_helper(result) if result else None
 
-async def delete_message_from_db(message_id: str):
+@model_call
+async def set_message_variants(message_id: str, image_variants: Dict[str, str]):
+    """Attach rendered image variants to a message; None if it no longer exists."""
+    col = await get_message_collection()
+    result = await col.find_one_and_update(
+        {"_id": ObjectId(message_id)},
+        {"$set": {"image_variants": image_variants}},
+        projection=MESSAGE_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    return message_helper(result) if result else None
+
+@model_call
+async def delete_message_from_db(message_id: str, sender_id: str | None = None):
+    """Delete a message; returns its room_id, or None if nothing matched."""
     col = await get_message_collection()
     try:
-        oid = ObjectId(message_id)
+        query = {"_id": ObjectId(message_id)}
+        if sender_id is not None:
+            query["sender_id"] = ObjectId(sender_id)
     except:
-        return False
+        return None
     
-    result = await col.delete_one({"_id": oid})
-    return result.deleted_count > 0
+    deleted = await col.find_one_and_delete(query, projection={"room_id": 1})
+    return str(deleted["room_id"]) if deleted else None
 
+@model_call
 async def get_message_by_id(message_id: str):
     col = await get_message_collection()
     try:
         oid = ObjectId(message_id)
     except:
         return None
-    doc = await col.find_one({"_id": oid})
+    doc = await col.find_one({"_id": oid}, MESSAGE_PROJECTION)
     return message_helper(doc) if doc else None
 
-async def find_messages_for_room(room_id: str, limit: int = 50):
+def encode_message_cursor(msg: Dict[str, Any]) -> str:
+    """Opaque keyset cursor for a message: its (created_at, id) position."""
+    raw = f"{msg['created_at'].isoformat()}|{msg['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(message_id)
+    except Exception as e:
+        raise ValueError("Invalid message cursor") from e
+
+
+def _keyset_filter(room_id: str, cursor: str, op: str) -> Dict[str, Any]:
+    created_at, oid = decode_message_cursor(cursor)
+    return {
+        "room_id": ObjectId(room_id),
+        "$or": [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "_id": {op: oid}},
+        ],
+    }
+
+
+@model_call
+async def find_messages_for_room(
+    room_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """
+    One page of a room's history in chronological order, using keyset
+    pagination on (created_at, _id). Without cursors this is the newest page;
+    `before` pages back from a cursor and `after` pages forward.
+    """
     col = await get_message_collection()
+    if after is not None:
+        cursor = (
+            col.find(_keyset_filter(room_id, after, "$gt"), MESSAGE_PROJECTION)
+            .sort([("created_at", 1), ("_id", 1)])
+            .limit(limit)
+        )
+        docs = await cursor.to_list(length=limit)
+        return [message_helper(d) for d in docs]
+
+    query = _keyset_filter(room_id, before, "$lt") if before is not None else {"room_id": ObjectId(room_id)}
     cursor = (
-        col.find({"room_id": ObjectId(room_id)})
-        .sort("created_at", -1)
+        col.find(query, MESSAGE_PROJECTION)
+        .sort([("created_at", -1), ("_id", -1)])
         .limit(limit)
     )
     docs = await cursor.to_list(length=limit)
-    return [message_helper(d) for d in docs][::-1]
+    return [message_helper(d) for d in reversed(docs)]
+
+
+def encode_search_cursor(hit: Dict[str, Any]) -> str:
+    """Opaque keyset cursor for a search hit: its (score, id) position."""
+    raw = f"{hit['score']!r}|{hit['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        score, message_id = raw.split("|", 1)
+        return float(score), ObjectId(message_id)
+    except Exception as e:
+        raise ValueError("Invalid search cursor") from e
+
+
+@model_call
+async def search_messages_in_rooms(
+    query: str,
+    room_ids: List[str],
+    limit: int = 20,
+    after: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Text search over the given rooms, best match first (ties newest first).
+    Paginated by keyset on (score, _id); `after` is the last hit's cursor.
+    """
+    col = await get_message_collection()
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": {"$text": {"$search": query}, "room_id": {"$in": [ObjectId(r) for r in room_ids]}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after is not None:
+        score, oid = decode_search_cursor(after)
+        pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "_id": {"$lt": oid}}]}})
+    pipeline += [
+        {"$sort": {"score": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": MESSAGE_PROJECTION},
+    ]
+    docs = await col.aggregate(pipeline).to_list(length=limit)
+    return [{**message_helper(d), "score": d["score"]} for d in docs]
+
+
+async def iter_messages_for_room(
+    room_id: str, after: Optional[str] = None, batch_size: int = 500
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream a room's full history oldest-first without materializing it."""
+    col = await get_message_collection()
+    query = _keyset_filter(room_id, after, "$gt") if after is not None else {"room_id": ObjectId(room_id)}
+    cursor = (
+        col.find(query, MESSAGE_PROJECTION)
+        .sort([("created_at", 1), ("_id", 1)])
+        .batch_size(batch_size)
+    )
+    async for doc in cursor:
+        yield message_helper(doc)
 
 # ... existing imports ...
 
 # Add this function to find rooms for a user
-async def find_rooms_for_user(user_id: str):
+@model_call
+async def find_rooms_for_user(user_id: str, limit: int, after: Optional[str] = None):
+    """One page of the user's rooms in _id order, starting after the room id `after`."""
     col = await get_room_collection()
-    cursor = col.find({"participants": user_id})
-    docs = await cursor.to_list(length=1000)
+    query: Dict[str, Any] = {"participants": user_id}
+    if after is not None:
+        query["_id"] = {"$gt": ObjectId(after)}
+    cursor = col.find(query).sort("_id", 1).limit(limit)
+    docs = await cursor.to_list(length=limit)
     return [room_helper(doc) for doc in docs]
 
-async def mark_message_as_read(message_id: str, user_id: str):
-    col = await get_message_collection()
+
+@model_call
+async def find_room_ids_for_user(user_id: str) -> List[str]:
+    col = await get_room_collection()
+    cursor = col.find({"participants": user_id}, {"_id": 1})
+    return [str(doc["_id"]) async for doc in cursor]
+
+
+# Room summary orderings: sort field and direction. Both fields can be null
+# (rooms without messages, unnamed direct rooms); Mongo sorts null lowest.
+ROOM_SUMMARY_SORTS = {
+    "activity": ("last_activity_at", DESCENDING),
+    "name": ("name", ASCENDING),
+}
+
+
+def encode_room_cursor(summary: Dict[str, Any], sort: str = "activity") -> str:
+    """Opaque keyset cursor for a room summary: its (sort value, id) position."""
+    field = ROOM_SUMMARY_SORTS[sort][0]
+    value = summary.get(field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, summary["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_room_cursor(cursor: str, sort: str = "activity") -> Tuple[Any, ObjectId]:
     try:
-        oid = ObjectId(message_id)
-    except:
-        return None
-    
-    # Add user_id to read_by set (avoids duplicates)
-    result = await col.find_one_and_update(
-        {"_id": oid},
-        {"$addToSet": {"read_by": user_id}},
-        return_document=True
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, room_id = json.loads(raw)
+        if value is not None and ROOM_SUMMARY_SORTS[sort][0] == "last_activity_at":
+            value = datetime.fromisoformat(value)
+        elif value is not None and not isinstance(value, str):
+            raise ValueError(value)
+        return value, ObjectId(room_id)
+    except Exception as e:
+        raise ValueError("Invalid room cursor") from e
+
+
+def _room_keyset_filter(field: str, direction: int, value: Any, oid: ObjectId) -> Dict[str, Any]:
+    """Rooms after (value, oid) in (field, _id) order, where field may be null."""
+    if direction == ASCENDING:
+        # Nulls come first: after a null, the remaining nulls and then every value.
+        if value is None:
+            return {"$or": [{field: None, "_id": {"$gt": oid}}, {field: {"$ne": None}}]}
+        return {"$or": [{field: {"$gt": value}}, {field: value, "_id": {"$gt": oid}}]}
+    # Nulls come last: after a value, smaller values and then all the nulls.
+    if value is None:
+        return {field: None, "_id": {"$lt": oid}}
+    return {"$or": [{field: {"$lt": value}}, {field: value, "_id": {"$lt": oid}}, {field: None}]}
+
+
+@model_call
+async def find_room_summaries_for_user(
+    user_id: str, limit: int, sort: str = "activity", after: Optional[str] = None
+):
+    """One page of the user's rooms with their denormalized last message, in `sort` order."""
+    col = await get_room_collection()
+    field, direction = ROOM_SUMMARY_SORTS[sort]
+    query: Dict[str, Any] = {"participants": user_id}
+    if after is not None:
+        query.update(_room_keyset_filter(field, direction, *decode_room_cursor(after, sort)))
+    cursor = col.find(query).sort([(field, direction), ("_id", direction)]).limit(limit)
+    docs = await cursor.to_list(length=limit)
+    return [room_summary_helper(doc) for doc in docs]
+
+
+@model_call
+async def apply_room_activity(docs: List[Dict[str, Any]]):
+    """
+    Keep room summaries current after a batch of messages was written:
+    each room's last_message/last_activity_at, and every other
+    participant's unread_count. One bulk_write per collection per batch.
+    """
+    latest: Dict[Any, Dict[str, Any]] = {}
+    per_sender: Dict[Tuple[Any, str], int] = {}
+    for doc in docs:
+        room_id = doc["room_id"]
+        if room_id not in latest or doc["created_at"] >= latest[room_id]["created_at"]:
+            latest[room_id] = doc
+        key = (room_id, str(doc["sender_id"]))
+        per_sender[key] = per_sender.get(key, 0) + 1
+
+    room_ops = [
+        UpdateOne(
+            # Only move forward; batches from other workers may land out of order.
+            {"_id": room_id, "$or": [{"last_activity_at": None}, {"last_activity_at": {"$lte": doc["created_at"]}}]},
+            {"$set": {"last_message": message_preview(doc), "last_activity_at": doc["created_at"]}},
+        )
+        for room_id, doc in latest.items()
+    ]
+    read_ops = [
+        UpdateMany({"room_id": room_id, "user_id": {"$ne": sender_id}}, {"$inc": {"unread_count": count}})
+        for (room_id, sender_id), count in per_sender.items()
+    ]
+    rooms = await get_room_collection()
+    reads = await get_read_collection()
+    if room_ops:
+        await rooms.bulk_write(room_ops, ordered=False)
+    if read_ops:
+        await reads.bulk_write(read_ops, ordered=False)
+
+
+@model_call
+async def update_room_preview(room_id: str, message_id: str, content: str):
+    """Refresh the stored preview if the edited message is the room's last one."""
+    col = await get_room_collection()
+    await col.update_one(
+        {"_id": ObjectId(room_id), "last_message.id": message_id},
+        {"$set": {"last_message.content": content[:PREVIEW_CHARS]}},
     )
-    return message_helper(result) if result else None
\ No newline at end of file
+
+
+@model_call
+async def retract_room_activity(room_id: str, message_id: str, sender_id: str):
+    """Undo a deleted message's effect on the room summary and unread counts."""
+    room_oid, message_oid = ObjectId(room_id), ObjectId(message_id)
+    reads = await get_read_collection()
+    # Only readers who had not read it yet were counting it.
+    await reads.update_many(
+        {
+            "room_id": room_oid,
+            "user_id": {"$ne": sender_id},
+            "unread_count": {"$gt": 0},
+            "$or": [{"last_read_message_id": None}, {"last_read_message_id": {"$lt": message_oid}}],
+        },
+        {"$inc": {"unread_count": -1}},
+    )
+
+    rooms = await get_room_collection()
+    room = await rooms.find_one({"_id": room_oid, "last_message.id": message_id}, {"_id": 1})
+    if room is None:
+        return
+    messages = await get_message_collection()
+    newest = await messages.find_one(
+        {"room_id": room_oid}, MESSAGE_PROJECTION, sort=[("created_at", DESCENDING), ("_id", DESCENDING)]
+    )
+    await rooms.update_one(
+        {"_id": room_oid, "last_message.id": message_id},
+        {"$set": {
+            "last_message": message_preview(newest) if newest else None,
+            "last_activity_at": newest["created_at"] if newest else None,
+        }},
+    )
+
+
+def read_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "room_id": str(doc["room_id"]),
+        "user_id": doc["user_id"],
+        "last_read_message_id": str(doc["last_read_message_id"]),
+        "updated_at": doc.get("updated_at"),
+    }
+
+
+async def get_read_collection():
+    db = get_database()
+    return db[READS_COLLECTION]
+
+
+@model_call
+async def advance_read_watermarks(watermarks: List[Tuple[str, str, str]]):
+    """
+    Move (room_id, user_id) read watermarks forward to message_id in one
+    bulk round trip. $max keeps a late or out-of-order update from moving
+    a watermark backwards.
+    """
+    col = await get_read_collection()
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"room_id": ObjectId(room_id), "user_id": user_id},
+            {"$max": {"last_read_message_id": ObjectId(message_id)}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for room_id, user_id, message_id in watermarks
+    ]
+    if ops:
+        await col.bulk_write(ops, ordered=False)
+
+
+@model_call
+async def find_message_room_ids(message_ids: List[str]) -> Dict[str, str]:
+    """message_id -> room_id for the ids that exist, in one round trip."""
+    col = await get_message_collection()
+    cursor = col.find({"_id": {"$in": [ObjectId(m) for m in message_ids]}}, {"room_id": 1})
+    docs = await cursor.to_list(length=None)
+    return {str(d["_id"]): str(d["room_id"]) for d in docs}
+
+
+@model_call
+async def refresh_unread_counts(watermarks: List[Tuple[str, str, str]]):
+    """
+    Recount unread messages after watermarks moved. Each count only scans
+    messages newer than the watermark; the $set is skipped if a newer
+    watermark won in the meantime.
+    """
+    messages = await get_message_collection()
+    reads = await get_read_collection()
+
+    async def recount(room_id: str, user_id: str, message_id: str):
+        room_oid, message_oid = ObjectId(room_id), ObjectId(message_id)
+        unread = await messages.count_documents(
+            {"room_id": room_oid, "_id": {"$gt": message_oid}, "sender_id": {"$ne": ObjectId(user_id)}}
+        )
+        return UpdateOne(
+            {"room_id": room_oid, "user_id": user_id, "last_read_message_id": message_oid},
+            {"$set": {"unread_count": unread}},
+        )
+
+    ops = await asyncio.gather(*(recount(*w) for w in watermarks))
+    if ops:
+        await reads.bulk_write(list(ops), ordered=False)
+
+
+@model_call
+async def init_read_states(room_id: str, user_ids: List[str], unread_counts: Optional[Dict[str, int]] = None):
+    """Create the per-participant read documents that carry unread counters."""
+    col = await get_read_collection()
+    unread_counts = unread_counts or {}
+    ops = [
+        UpdateOne(
+            {"room_id": ObjectId(room_id), "user_id": user_id},
+            {"$setOnInsert": {"last_read_message_id": None, "unread_count": unread_counts.get(user_id, 0)}},
+            upsert=True,
+        )
+        for user_id in user_ids
+    ]
+    if ops:
+        await col.bulk_write(ops, ordered=False)
+
+
+@model_call
+async def find_unread_counts(user_id: str, room_ids: List[str]) -> Dict[str, int]:
+    col = await get_read_collection()
+    cursor = col.find(
+        {"user_id": user_id, "room_id": {"$in": [ObjectId(r) for r in room_ids]}},
+        {"room_id": 1, "unread_count": 1},
+    )
+    docs = await cursor.to_list(length=None)
+    return {str(d["room_id"]): max(0, d.get("unread_count", 0)) for d in docs}
+
+
+@model_call
+async def find_read_watermarks(room_id: str) -> List[Dict[str, Any]]:
+    col = await get_read_collection()
+    cursor = col.find({"room_id": ObjectId(room_id), "last_read_message_id": {"$ne": None}})
+    docs = await cursor.to_list(length=None)
+    return [read_helper(d) for d in docs]
@@ -1,10 +1,19 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
+import re
+import sys
+import unicodedata
 from bson import ObjectId
+from pymongo import UpdateOne
 
 from app.core.database import get_database
+from app.core.metrics import model_call
 
 USERS_COLLECTION = "users"
 
+# Only what search results and listings need; never hashed_password or the friends array.
+PUBLIC_PROJECTION = {"email": 1, "username": 1}
+COMPACT_PROJECTION = {"username": 1}
+
 
 def user_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
     return {
@@ -17,17 +26,47 @@ def user_helper(doc: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def normalize_username(username: str) -> str:
+    """Search key: NFKC-normalized and case-folded, so "ÉVA" and "éva" match."""
+    return unicodedata.normalize("NFKC", username).casefold().strip()
+
+
+def username_trigrams(username: str) -> List[str]:
+    name = normalize_username(username)
+    return sorted({name[i:i + 3] for i in range(len(name) - 2)})
+
+
+def username_search_fields(username: str) -> Dict[str, Any]:
+    return {"username_lower": normalize_username(username), "username_trigrams": username_trigrams(username)}
+
+
+def _prefix_range(prefix: str) -> Dict[str, str]:
+    # Everything that sorts between the prefix and its successor, i.e. starts with it.
+    # Mongo compares UTF-8 bytes, which is code point order. A trailing U+10FFFF
+    # has no successor, so the one before it is bumped instead.
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return {"$regex": "^" + re.escape(prefix)}
+    successor = ord(stem[-1]) + 1
+    if 0xD800 <= successor <= 0xDFFF:
+        # Surrogates can't be encoded; the next real character is U+E000.
+        successor = 0xE000
+    return {"$gte": prefix, "$lt": stem[:-1] + chr(successor)}
+
+
 async def get_user_collection():
     db = get_database()
     return db[USERS_COLLECTION]
 
 
+@model_call
 async def find_user_by_email(email: str):
     col = await get_user_collection()
     doc = await col.find_one({"email": email})
     return user_helper(doc) if doc else None
 
 
+@model_call
 async def find_user_by_id(user_id: str):
     col = await get_user_collection()
     try:
@@ -38,15 +77,122 @@ async def find_user_by_id(user_id: str):
     return user_helper(doc) if doc else None
 
 
+@model_call
 async def insert_user(email: str, username: str, hashed_password: str) -> Dict[str, Any]:
     col = await get_user_collection()
-    result = await col.insert_one(
-        {"email": email, "username": username, "hashed_password": hashed_password, "friends": []}
+    doc = {
+        "email": email,
+        "username": username,
+        "hashed_password": hashed_password,
+        "friends": [],
+        **username_search_fields(username),
+    }
+    result = await col.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return user_helper(doc)
+
+
+@model_call
+async def find_users_page(limit: int, after: Optional[str] = None, compact: bool = False) -> List[Dict[str, Any]]:
+    """One page of users in _id order, starting after the user id `after` (keyset on _id)."""
+    col = await get_user_collection()
+    query = {"_id": {"$gt": ObjectId(after)}} if after is not None else {}
+    projection = COMPACT_PROJECTION if compact else PUBLIC_PROJECTION
+    cursor = col.find(query, projection).sort("_id", 1).limit(limit)
+    docs = await cursor.to_list(length=limit)
+    return [{"id": str(d["_id"]), **{k: d[k] for k in projection}} for d in docs]
+
+
+@model_call
+async def find_users_by_ids(user_ids: List[str], compact: bool = False) -> List[Dict[str, Any]]:
+    """Public profiles for many users in one $in query, in the order of `user_ids`."""
+    oids = [ObjectId(u) for u in user_ids if ObjectId.is_valid(u)]
+    if not oids:
+        return []
+    col = await get_user_collection()
+    projection = COMPACT_PROJECTION if compact else PUBLIC_PROJECTION
+    found = {
+        str(d["_id"]): {"id": str(d["_id"]), **{k: d[k] for k in projection}}
+        async for d in col.find({"_id": {"$in": oids}}, projection)
+    }
+    return [found[u] for u in user_ids if u in found]
+
+
+@model_call
+async def set_friend_edge(user_id: str, friend_id: str, connected: bool) -> int:
+    """
+    Add (or remove) the friendship on both users in a single bulk_write.
+    Returns how many of the two users matched.
+    """
+    col = await get_user_collection()
+    op = "$addToSet" if connected else "$pull"
+    result = await col.bulk_write(
+        [
+            UpdateOne({"_id": ObjectId(user_id)}, {op: {"friends": friend_id}}),
+            UpdateOne({"_id": ObjectId(friend_id)}, {op: {"friends": user_id}}),
+        ],
+        ordered=False,
     )
-    new_doc = await col.find_one({"_id": result.inserted_id})
-    return user_helper(new_doc)
+    return result.matched_count
+
+
+@model_call
+async def find_friend_of_friend_ids(user_id: str, friend_ids: List[str], limit: int) -> List[Dict[str, Any]]:
+    """Users two hops away (not already friends), ranked by number of mutual friends."""
+    oids = [ObjectId(f) for f in friend_ids if ObjectId.is_valid(f)]
+    if not oids:
+        return []
+    col = await get_user_collection()
+    pipeline = [
+        {"$match": {"_id": {"$in": oids}}},
+        {"$project": {"friends": 1}},
+        {"$unwind": "$friends"},
+        {"$match": {"friends": {"$nin": friend_ids + [user_id]}}},
+        {"$group": {"_id": "$friends", "mutual_friends": {"$sum": 1}}},
+        {"$sort": {"mutual_friends": -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+    docs = await col.aggregate(pipeline).to_list(length=limit)
+    return [{"id": d["_id"], "mutual_friends": d["mutual_friends"]} for d in docs]
+
+
+@model_call
+async def find_users_by_prefix(
+    prefix: str, limit: int, user_ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Users whose normalized username starts with `prefix`, alphabetically (index range scan)."""
+    col = await get_user_collection()
+    query: Dict[str, Any] = {"username_lower": _prefix_range(normalize_username(prefix))}
+    if user_ids is not None:
+        query["_id"] = {"$in": [ObjectId(u) for u in user_ids if ObjectId.is_valid(u)]}
+    cursor = col.find(query, PUBLIC_PROJECTION).sort("username_lower", 1).limit(limit)
+    return [{"id": str(d["_id"]), "email": d["email"], "username": d["username"]} async for d in cursor]
+
+
+@model_call
+async def find_users_by_trigrams(query: str, limit: int, exclude_ids: List[str]) -> List[Dict[str, Any]]:
+    """Fuzzy matches: users sharing the most username trigrams with `query`."""
+    grams = username_trigrams(query)
+    if not grams:
+        return []
+    col = await get_user_collection()
+    pipeline = [
+        {"$match": {
+            "username_trigrams": {"$in": grams},
+            "_id": {"$nin": [ObjectId(u) for u in exclude_ids]},
+        }},
+        {"$project": {
+            **PUBLIC_PROJECTION,
+            "overlap": {"$size": {"$setIntersection": ["$username_trigrams", grams]}},
+        }},
+        {"$sort": {"overlap": -1, "username": 1}},
+        {"$limit": limit},
+    ]
+    docs = await col.aggregate(pipeline).to_list(length=limit)
+    return [{"id": str(d["_id"]), "email": d["email"], "username": d["username"]} for d in docs]
 
 # --- NEW FUNCTION FOR SESSION MANAGEMENT ---
+@model_call
 async def update_last_login_salt(user_id: str):
     """Generates a new salt/session ID and updates the user record."""
     col = await get_user_collection()
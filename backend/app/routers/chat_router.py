@@ -1,12 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
-from typing import List
-import shutil
-import uuid
-import os
-import cloudinary
-import cloudinary.uploader
-
-from app.core.config import settings
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from app.core.security import get_current_user
 from app.schemas.user_schema import UserInDB
 from app.schemas.chat_schema import (
@@ -14,32 +9,54 @@ from app.schemas.chat_schema import (
     ChatRoomInDB,
     ChatMessageCreate,
     ChatMessageInDB,
+    ChatRoomSummary,
+    MessageSearchHit,
+    RoomReadState,
 )
+from app.services.upload_service import UploadError, UploadTooLarge, receive_upload
+from app.services.media_service import schedule_variants, variant_urls_for
+from app.models.chat_model import (
+    decode_message_cursor,
+    decode_room_cursor,
+    decode_search_cursor,
+    encode_message_cursor,
+    encode_room_cursor,
+    encode_search_cursor,
+)
+from app.utils.serialization import dumps
 from app.services.chat_service import (
     create_chat_room,
     get_messages,
+    stream_messages,
     send_message,
     get_or_create_direct_room,
-    get_user_rooms
+    get_user_rooms,
+    get_read_states,
+    get_room_summaries,
+    require_room_member,
+    search_messages,
 )
 
 router = APIRouter(prefix="/chats", tags=["Chats"])
 
 # --- UPLOAD ENDPOINT ---
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    # Configure Cloudinary
-    cloudinary.config( 
-        cloud_name = settings.CLOUDINARY_CLOUD_NAME, 
-        api_key = settings.CLOUDINARY_API_KEY, 
-        api_secret = settings.CLOUDINARY_API_SECRET 
-    )
-    
-    # Upload file to Cloudinary
-    result = cloudinary.uploader.upload(file.file, resource_type="auto")
-    
-    # Return the secure URL
-    return {"url": result.get("secure_url")}
+async def upload_file(request: Request):
+    # Multipart form with a "file" field (or a raw body). The body is read
+    # from the request stream in chunks; size limits apply while streaming.
+    try:
+        stored = await receive_upload(request, field="file")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Thumbnails etc. are rendered in the background; a message sent with this
+    # URL picks them up once they exist. Only a re-upload has them already.
+    variants = await variant_urls_for(stored.url)
+    if variants is None:
+        schedule_variants(stored)
+    return {"url": stored.url, "variants": variants}
 
 
 # --- ROOM ENDPOINTS ---
@@ -52,8 +69,38 @@ async def create_room(room_in: ChatRoomCreate, current_user: UserInDB = Depends(
 
 # Add this endpoint to list user's rooms
 @router.get("/rooms", response_model=List[ChatRoomInDB])
-async def get_my_rooms(current_user: UserInDB = Depends(get_current_user)):
-    return await get_user_rooms(current_user.id)
+async def get_my_rooms(
+    response: Response,
+    limit: int = Query(1000, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor: the last room id of the previous page"),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """The caller's rooms in stable _id order; follow X-Next-Cursor for the next page."""
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid room cursor")
+    rooms = await get_user_rooms(current_user.id, limit, after=after)
+    if len(rooms) == limit:
+        response.headers["X-Next-Cursor"] = rooms[-1].id
+    return rooms
+
+@router.get("/rooms/summary", response_model=List[ChatRoomSummary])
+async def get_my_room_summaries(
+    response: Response,
+    sort: str = Query("activity", pattern="^(activity|name)$"),
+    limit: int = Query(1000, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor (same sort)"),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Room list with last message preview and the caller's unread count."""
+    if after is not None:
+        try:
+            decode_room_cursor(after, sort)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    summaries = await get_room_summaries(current_user.id, limit, sort, after=after)
+    if len(summaries) == limit:
+        response.headers["X-Next-Cursor"] = encode_room_cursor(summaries[-1].model_dump(), sort)
+    return summaries
 
 @router.post("/rooms/direct/{other_user_id}", response_model=ChatRoomInDB)
 async def get_or_create_direct(
@@ -64,13 +111,82 @@ async def get_or_create_direct(
 
 
 # --- MESSAGE ENDPOINTS ---
+def _validate_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return
+    try:
+        decode_message_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/rooms/{room_id}/messages", response_model=List[ChatMessageInDB])
 async def get_room_messages(
     room_id: str,
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
-    _: UserInDB = Depends(get_current_user),
+    before: Optional[str] = Query(None, description="Cursor: page of messages older than this one"),
+    after: Optional[str] = Query(None, description="Cursor: page of messages newer than this one"),
+    current_user: UserInDB = Depends(get_current_user),
 ):
-    return await get_messages(room_id, limit)
+    await require_room_member(room_id, current_user.id)
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    _validate_cursor(before)
+    _validate_cursor(after)
+
+    messages = await get_messages(room_id, limit, before=before, after=after)
+    if messages:
+        # X-Prev-Cursor pages further back, X-Next-Cursor picks up newer messages.
+        response.headers["X-Prev-Cursor"] = encode_message_cursor(messages[0].model_dump())
+        response.headers["X-Next-Cursor"] = encode_message_cursor(messages[-1].model_dump())
+    return messages
+
+
+@router.get("/messages/search", response_model=List[MessageSearchHit])
+async def search_room_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    room_id: Optional[str] = Query(None, description="Only search this room"),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor: hits ranked after this one"),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Full-text search over the caller's rooms, best match first."""
+    if after is not None:
+        try:
+            decode_search_cursor(after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    hits = await search_messages(current_user.id, q, room_id=room_id, limit=limit, after=after)
+    if len(hits) == limit:
+        response.headers["X-Next-Cursor"] = encode_search_cursor(hits[-1].model_dump())
+    return hits
+
+
+@router.get("/rooms/{room_id}/messages/export")
+async def export_room_messages(
+    room_id: str,
+    after: Optional[str] = Query(None, description="Cursor: only export messages newer than this one"),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Full room history as NDJSON, oldest first, streamed with bounded memory."""
+    await require_room_member(room_id, current_user.id)
+    _validate_cursor(after)
+
+    async def lines():
+        async for doc in stream_messages(room_id, after=after):
+            yield dumps(doc) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/rooms/{room_id}/reads", response_model=List[RoomReadState])
+async def get_room_reads(room_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """Each participant's "read up to" watermark for the room."""
+    await require_room_member(room_id, current_user.id)
+    return await get_read_states(room_id)
 
 
 @router.post("/rooms/{room_id}/messages", response_model=ChatMessageInDB)
@@ -81,11 +197,13 @@ async def post_message(
 ):
     if room_id != message_in.room_id:
         raise HTTPException(status_code=400, detail="Room ID mismatch")
+    await require_room_member(room_id, current_user.id)
     
     # FIX: Pass image_url to the service
     return await send_message(
         room_id, 
         current_user.id, 
         message_in.content, 
-        message_in.image_url
+        message_in.image_url,
+        durable=True,
     )
\ No newline at end of file
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends
-from typing import List
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional, Union
 
-from app.schemas.user_schema import UserPublic, UserInDB
+from app.schemas.user_schema import FriendSuggestion, UserCompact, UserPublic, UserInDB
 from app.core.security import get_current_user
 from app.services.user_service import list_users, search_users
-from app.services.friend_services import add_friend, remove_friend  
+from app.services.friend_services import add_friend, get_friend_suggestions, get_friends, remove_friend  
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -14,26 +15,61 @@ async def get_me(current_user: UserInDB = Depends(get_current_user)):
     return UserPublic(id=current_user.id, email=current_user.email, username=current_user.username)
 
 
-@router.get("/", response_model=List[UserPublic])
-async def get_users(_: UserInDB = Depends(get_current_user)):
-    return await list_users()
+@router.get("/", response_model=Union[List[UserPublic], List[UserCompact]])
+async def get_users(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = Query(None, description="Cursor: the last user id of the previous page"),
+    compact: bool = Query(False, description="Only id and username"),
+    _: UserInDB = Depends(get_current_user),
+):
+    """User directory in stable _id order; follow X-Next-Cursor for the next page."""
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid user cursor")
+    users = await list_users(limit, after=after, compact=compact)
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = users[-1].id
+    return users
 
 
 @router.get("/search", response_model=List[UserPublic])
-async def search(q: str, _: UserInDB = Depends(get_current_user)):
-    return await search_users(q)
+async def search(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(20, ge=1, le=50),
+    fuzzy: bool = Query(False, description="Fill the page with approximate (trigram) matches"),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Username prefix search; the caller's friends are ranked first."""
+    return await search_users(q, current_user, limit=limit, fuzzy=fuzzy)
 
 @router.post("/add-friend/{friend_id}")
 async def add_friend_route(friend_id: str, current_user: UserInDB = Depends(get_current_user)):
-    await add_friend(current_user.id, friend_id)
+    try:
+        await add_friend(current_user.id, friend_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     return {"message": "Friend added successfully"}
 
 @router.delete("/remove-friend/{friend_id}")
 async def remove_friend_route(friend_id: str, current_user: UserInDB = Depends(get_current_user)):
-    await remove_friend(current_user.id, friend_id)
+    try:
+        await remove_friend(current_user.id, friend_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"message": "Friend removed successfully"}
 
-@router.get("/friends")
-async def get_friends(current_user: UserInDB = Depends(get_current_user)):
-    return current_user.friends
+@router.get("/friends", response_model=List[UserPublic])
+async def get_my_friends(current_user: UserInDB = Depends(get_current_user)):
+    """The caller's friends as profiles, resolved in one batch query."""
+    return await get_friends(current_user)
+
+@router.get("/friends/suggestions", response_model=List[FriendSuggestion])
+async def get_my_friend_suggestions(
+    limit: int = Query(10, ge=1, le=50),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Friends of friends, ranked by number of mutual friends."""
+    return await get_friend_suggestions(current_user, limit)
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -16,9 +16,21 @@ class ChatMessageInDB(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None  # thumb / preview / full
     read_by:List[str] = []
 
 
+class MessageSearchHit(ChatMessageInDB):
+    score: float  # text relevance; higher is better
+
+
+class RoomReadState(BaseModel):
+    room_id: str
+    user_id: str
+    last_read_message_id: str
+    updated_at: Optional[datetime] = None
+
+
 class ChatRoomCreate(BaseModel):
     name: Optional[str] = None
     is_group: bool = False
@@ -34,3 +46,17 @@ class ChatRoomInDB(BaseModel):
 
 class ChatRoomPublic(ChatRoomInDB):
     pass
+
+
+class LastMessagePreview(BaseModel):
+    id: str
+    sender_id: str
+    content: str
+    has_image: bool = False
+    created_at: datetime
+
+
+class ChatRoomSummary(ChatRoomInDB):
+    last_message: Optional[LastMessagePreview] = None
+    last_activity_at: Optional[datetime] = None
+    unread_count: int = 0
@@ -27,6 +27,16 @@ class UserPublic(UserBase):
     id: str
     friends :list[str] = []
 
+
+class UserCompact(BaseModel):
+    """Directory entry for list views: just enough to render a name."""
+    id: str
+    username: str
+
+
+class FriendSuggestion(UserCompact):
+    mutual_friends: int
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -1,16 +1,17 @@
 from typing import Optional
 
 from app.models.user_model import find_user_by_email, insert_user,update_last_login_salt
-from app.utils.hashing import hash_password, verify_password
+from app.utils.hashing import hash_password_async, verify_password_async
 from app.utils.jwt import create_access_token
 from app.schemas.user_schema import UserCreate, UserLogin, UserInDB, Token
+from app.services.user_cache import user_cache
 
 
 async def register_user(user_in: UserCreate) -> UserInDB:
     existing = await find_user_by_email(user_in.email)
     if existing:
         raise ValueError("User with this email already exists")
-    hashed = hash_password(user_in.password)
+    hashed = await hash_password_async(user_in.password)
     user_doc = await insert_user(user_in.email, user_in.username, hashed)
     return UserInDB(**user_doc)
 
@@ -19,7 +20,7 @@ async def authenticate_user(email: str, password: str) -> Optional[UserInDB]:
     user_doc = await find_user_by_email(email)
     if not user_doc:
         return None
-    if not verify_password(password, user_doc["hashed_password"]):
+    if not await verify_password_async(password, user_doc["hashed_password"]):
         return None
     return UserInDB(**user_doc)
 
@@ -31,6 +32,8 @@ async def login_user(user_in: UserLogin) -> Token:
 
     # 1. Update the session salt (This invalidates all previous tokens)
     updated_user_doc = await update_last_login_salt(user.id)
+    # Tokens with the old salt must stop working on every worker right away.
+    await user_cache.invalidate(user.id)
     if not updated_user_doc:
         # Should ideally not happen if authenticate_user succeeded
         raise ValueError("Login failed due to user data update error")
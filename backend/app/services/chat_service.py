@@ -1,23 +1,63 @@
-from typing import List,Optional
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
 from fastapi import HTTPException
 
 from app.models.chat_model import (
     insert_room,
     find_room_by_id,
-    find_direct_room,
-    insert_message,
+    direct_pair_key,
+    upsert_direct_room,
     find_messages_for_room,
+    iter_messages_for_room,
     update_message,
+    set_message_variants,
     delete_message_from_db,
     get_message_by_id,
     find_rooms_for_user,
-    mark_message_as_read
+    find_room_ids_for_user,
+    search_messages_in_rooms,
+    find_read_watermarks,
+    find_room_summaries_for_user,
+    find_unread_counts,
+    update_room_preview,
+    retract_room_activity,
 )
-from app.schemas.chat_schema import ChatRoomInDB, ChatRoomCreate, ChatMessageInDB
+from app.schemas.chat_schema import (
+    ChatRoomInDB,
+    ChatRoomCreate,
+    ChatMessageInDB,
+    ChatRoomSummary,
+    MessageSearchHit,
+    RoomReadState,
+)
+from app.services.message_ingestor import message_ingestor
+from app.services.message_cache import message_cache
+from app.services.read_receipts import read_receipts
+from app.services.room_cache import room_members
+from app.services.media_service import render_in_flight, variant_urls_for
+from app.core.config import settings
+from app.utils.ttl_cache import TTLCache
 from fastapi import HTTPException
 
+logger = logging.getLogger(__name__)
+
+# pair_key -> direct room, in front of the upsert for repeat opens of the same DM
+_direct_rooms = TTLCache(settings.DIRECT_ROOM_CACHE_MAX_ENTRIES, settings.DIRECT_ROOM_CACHE_TTL_SECONDS)
+
+# Called with a message once its image variants have been attached after the send.
+VariantsListener = Callable[[ChatMessageInDB], Awaitable[None]]
+_variants_listeners: List[VariantsListener] = []
+_variant_tasks: Set[asyncio.Task] = set()
+
+
+def add_variants_listener(listener: VariantsListener):
+    _variants_listeners.append(listener)
+
+
 async def create_chat_room(room_in: ChatRoomCreate) -> ChatRoomInDB:
     doc = await insert_room(room_in.name, room_in.is_group, room_in.participants)
+    room_members.set(doc["id"], doc["participants"])
     return ChatRoomInDB(**doc)
 
 
@@ -27,52 +67,181 @@ async def get_room(room_id: str) -> ChatRoomInDB | None:
 
 
 async def get_or_create_direct_room(user1_id: str, user2_id: str) -> ChatRoomInDB:
-    doc = await find_direct_room(user1_id, user2_id)
-    if doc:
-        return ChatRoomInDB(**doc)
-    doc = await insert_room(
-        name=None, is_group=False, participants=[user1_id, user2_id]
-    )
-    return ChatRoomInDB(**doc)
+    key = direct_pair_key(user1_id, user2_id)
+    room = _direct_rooms.get(key)
+    if room is not None:
+        return room
+    doc = await upsert_direct_room(user1_id, user2_id)
+    room = ChatRoomInDB(**doc)
+    _direct_rooms.set(key, room)
+    room_members.set(room.id, room.participants)
+    return room
+
+async def require_room_member(room_id: str, user_id: str):
+    # Served from the membership cache; unknown rooms are indistinguishable from forbidden ones.
+    if not await room_members.is_member(room_id, user_id):
+        raise HTTPException(status_code=403, detail="Not a participant of this room")
 
-async def get_user_rooms(user_id: str) -> List[ChatRoomInDB]:
-    docs = await find_rooms_for_user(user_id)
+async def get_user_rooms(user_id: str, limit: int, after: Optional[str] = None) -> List[ChatRoomInDB]:
+    docs = await find_rooms_for_user(user_id, limit, after=after)
     return [ChatRoomInDB(**d) for d in docs]
 
-async def send_message(room_id: str, sender_id: str, content: str ,image_url: str = None) -> ChatMessageInDB:
-    doc = await insert_message(room_id, sender_id, content ,image_url)
-    return ChatMessageInDB(**doc)
+async def get_room_summaries(
+    user_id: str, limit: int, sort: str = "activity", after: Optional[str] = None
+) -> List[ChatRoomSummary]:
+    # Two reads per page regardless of room count: the rooms (with their
+    # denormalized last message) and the caller's unread counters.
+    docs = await find_room_summaries_for_user(user_id, limit, sort, after=after)
+    unread = await find_unread_counts(user_id, [d["id"] for d in docs])
+    return [ChatRoomSummary(**d, unread_count=unread.get(d["id"], 0)) for d in docs]
+
+async def send_message(
+    room_id: str,
+    sender_id: str,
+    content: str,
+    image_url: str = None,
+    durable: bool | None = None,
+) -> ChatMessageInDB:
+    # Buffered write-behind by default; durable=True waits for the batch to be acknowledged.
+    if durable is None:
+        durable = settings.MESSAGE_WRITE_MODE == "acknowledged"
+    # Taken first, so a render finishing in between is still seen below.
+    render = render_in_flight(image_url)
+    try:
+        doc = await message_ingestor.submit(
+            room_id,
+            sender_id,
+            content,
+            image_url,
+            durable=durable,
+            image_variants=await variant_urls_for(image_url),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    msg = ChatMessageInDB(**doc)
+    await message_cache.on_message_created(msg)
+
+    # Never hold the send for a thumbnail: attach the variants when the render is done.
+    if render is not None and msg.image_variants is None:
+        task = asyncio.create_task(_attach_variants(msg, render))
+        _variant_tasks.add(task)
+        task.add_done_callback(_variant_tasks.discard)
+    return msg
+
+
+async def _attach_variants(msg: ChatMessageInDB, render: asyncio.Task):
+    try:
+        await asyncio.shield(render)
+        variants = await variant_urls_for(msg.image_url)
+        if variants is None:
+            return
+        await message_ingestor.flush_if_pending(msg.id)
+        doc = await set_message_variants(msg.id, variants)
+        if doc is None:
+            return  # deleted in the meantime
+        updated = ChatMessageInDB(**doc)
+        await message_cache.on_message_edited(updated)
+        for listener in _variants_listeners:
+            await listener(updated)
+    except Exception:
+        logger.exception("Attaching image variants to message %s failed", msg.id)
 
 
-async def get_messages(room_id: str, limit: int = 50) -> List[ChatMessageInDB]:
-    docs = await find_messages_for_room(room_id, limit)
-    return [ChatMessageInDB(**d) for d in docs]
+async def get_messages(
+    room_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> List[ChatMessageInDB]:
+    first_page = before is None and after is None
+    if first_page:
+        cached = message_cache.get_page(room_id, limit)
+        if cached is not None:
+            return cached
+
+    if not first_page:
+        await message_ingestor.flush_room(room_id)
+        docs = await find_messages_for_room(room_id, limit, before=before, after=after)
+        return [ChatMessageInDB(**d) for d in docs]
+
+    # Cache miss: read a full buffer's worth so the next opens are hits.
+    # Sends that land while the read is in flight are merged by fill().
+    pending = message_cache.begin_fill(room_id)
+    try:
+        await message_ingestor.flush_room(room_id)
+        fetch = max(limit, message_cache.per_room)
+        docs = await find_messages_for_room(room_id, fetch)
+    except BaseException:
+        message_cache.cancel_fill(pending)
+        raise
+    messages = [ChatMessageInDB(**d) for d in docs]
+    messages = message_cache.fill(room_id, messages, complete=len(messages) < fetch, pending=pending)
+    return messages[-limit:]
+
+
+async def search_messages(
+    user_id: str,
+    query: str,
+    room_id: Optional[str] = None,
+    limit: int = 20,
+    after: Optional[str] = None,
+) -> List[MessageSearchHit]:
+    """Search the caller's rooms (or just `room_id`, which they must belong to)."""
+    if room_id is not None:
+        await require_room_member(room_id, user_id)
+        # Searching one room: include messages still in the write-behind buffer.
+        await message_ingestor.flush_room(room_id)
+        room_ids = [room_id]
+    else:
+        room_ids = await find_room_ids_for_user(user_id)
+    if not room_ids:
+        return []
+    docs = await search_messages_in_rooms(query, room_ids, limit, after=after)
+    return [MessageSearchHit(**d) for d in docs]
+
+
+async def stream_messages(room_id: str, after: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    await message_ingestor.flush_room(room_id)
+    async for doc in iter_messages_for_room(room_id, after=after):
+        yield doc
 
 async def edit_message(message_id: str, user_id: str, new_content: str) -> Optional[ChatMessageInDB]:
-    # 1. Fetch message to verify owner
+    await message_ingestor.flush_if_pending(message_id)
+    # 1. Update only if this user is the author (single round trip)
+    updated_doc = await update_message(message_id, new_content, sender_id=user_id)
+    if updated_doc:
+        msg = ChatMessageInDB(**updated_doc)
+        await message_cache.on_message_edited(msg)
+        await update_room_preview(msg.room_id, msg.id, msg.content)
+        return msg
+
+    # 2. Nothing matched: tell "missing" apart from "not yours"
     msg = await get_message_by_id(message_id)
     if not msg:
         return None
-    
-    if msg["sender_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to edit this message")
-    
-    # 2. Update
-    updated_doc = await update_message(message_id, new_content)
-    return ChatMessageInDB(**updated_doc) if updated_doc else None
-
-async def remove_message(message_id: str, user_id: str) -> bool:
-    # 1. Fetch message to verify owner
+    raise HTTPException(status_code=403, detail="Not authorized to edit this message")
+
+async def remove_message(message_id: str, user_id: str) -> Optional[str]:
+    """Delete the caller's message; returns the room it was in, or None if it doesn't exist."""
+    await message_ingestor.flush_if_pending(message_id)
+    # 1. Delete only if this user is the author (single round trip)
+    room_id = await delete_message_from_db(message_id, sender_id=user_id)
+    if room_id:
+        await message_cache.on_message_deleted(message_id)
+        await retract_room_activity(room_id, message_id, user_id)
+        return room_id
+
+    # 2. Nothing deleted: tell "missing" apart from "not yours"
     msg = await get_message_by_id(message_id)
     if not msg:
-        return False
-    
-    if msg["sender_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this message")
-    
-    # 2. Delete
-    return await delete_message_from_db(message_id)
-
-async def mark_msg_read(message_id: str, user_id: str) -> Optional[ChatMessageInDB]:
-    doc = await mark_message_as_read(message_id, user_id)
-    return ChatMessageInDB(**doc) if doc else None
\ No newline at end of file
+        return None
+    raise HTTPException(status_code=403, detail="Not authorized to delete this message")
+
+def mark_read(room_id: str, user_id: str, message_id: str) -> bool:
+    # Only raises the in-memory watermark; the aggregator writes and
+    # broadcasts it once per flush interval.
+    return read_receipts.mark_read(room_id, user_id, message_id)
+
+async def get_read_states(room_id: str) -> List[RoomReadState]:
+    docs = await find_read_watermarks(room_id)
+    return [RoomReadState(**d) for d in docs]
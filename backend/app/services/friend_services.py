@@ -1,35 +1,66 @@
+from typing import List
+
 from bson import ObjectId
-from app.core.database import get_database
 
-async def add_friend(user_id: str, friend_id: str):
-    db = get_database()
-    users = db["users"]
+from app.core.config import settings
+from app.models.user_model import find_friend_of_friend_ids, find_users_by_ids, set_friend_edge
+from app.schemas.user_schema import FriendSuggestion, UserInDB, UserPublic
+from app.services.user_cache import user_cache
+from app.utils.ttl_cache import TTLCache
+
+# user_id -> ranked suggestions; dropped for both users whenever an edge changes
+_suggestions = TTLCache(
+    settings.FRIEND_SUGGESTIONS_CACHE_MAX_ENTRIES, settings.FRIEND_SUGGESTIONS_TTL_SECONDS
+)
+
+
+def _check_friend_id(user_id: str, friend_id: str):
+    if not ObjectId.is_valid(friend_id):
+        raise ValueError("Invalid user id")
+    if friend_id == user_id:
+        raise ValueError("You cannot add yourself as a friend")
 
-    await users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$addToSet": {"friends": friend_id}}
-    )
 
-    await users.update_one(
-        {"_id": ObjectId(friend_id)},
-        {"$addToSet": {"friends": user_id}}
-    )
+async def _edge_changed(user_id: str, friend_id: str):
+    _suggestions.pop(user_id)
+    _suggestions.pop(friend_id)
+    await user_cache.invalidate(user_id, friend_id)
 
+
+async def add_friend(user_id: str, friend_id: str):
+    _check_friend_id(user_id, friend_id)
+    matched = await set_friend_edge(user_id, friend_id, connected=True)
+    if matched < 2:
+        # The other user doesn't exist: undo our half instead of keeping a dangling id.
+        await set_friend_edge(user_id, friend_id, connected=False)
+        await _edge_changed(user_id, friend_id)
+        raise LookupError("User not found")
+    await _edge_changed(user_id, friend_id)
     return True
 
 
 async def remove_friend(user_id: str, friend_id: str):
-    db = get_database()
-    users = db["users"]
+    _check_friend_id(user_id, friend_id)
+    await set_friend_edge(user_id, friend_id, connected=False)
+    await _edge_changed(user_id, friend_id)
+    return True
 
-    await users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$pull": {"friends": friend_id}}
-    )
 
-    await users.update_one(
-        {"_id": ObjectId(friend_id)},
-        {"$pull": {"friends": user_id}}
-    )
+async def get_friends(user: UserInDB) -> List[UserPublic]:
+    # One $in query with a projection, instead of the client resolving ids itself.
+    docs = await find_users_by_ids(user.friends)
+    return [UserPublic(**d) for d in docs]
 
-    return True
+
+async def get_friend_suggestions(user: UserInDB, limit: int = 10) -> List[FriendSuggestion]:
+    cached = _suggestions.get(user.id)
+    if cached is None:
+        ranked = await find_friend_of_friend_ids(user.id, user.friends, settings.FRIEND_SUGGESTIONS_MAX)
+        profiles = {d["id"]: d for d in await find_users_by_ids([r["id"] for r in ranked], compact=True)}
+        cached = [
+            FriendSuggestion(**profiles[r["id"]], mutual_friends=r["mutual_friends"])
+            for r in ranked
+            if r["id"] in profiles
+        ]
+        _suggestions.set(user.id, cached)
+    return cached[:limit]
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.storage import StoredObject, get_storage
+from app.storage.base import IMAGE_VARIANTS, is_image_key
+
+logger = logging.getLogger(__name__)
+
+# Written last, so its presence means the whole set is there.
+_LAST_VARIANT = list(IMAGE_VARIANTS)[-1]
+
+_pool: ProcessPoolExecutor | None = None
+# key -> in-flight render, so a send can attach the variants once they exist.
+_renders: Dict[str, asyncio.Task] = {}
+
+
+def render_variants(source_path: str) -> Dict[str, bytes]:
+    """Resize and re-encode an image into every display variant. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    rendered = {}
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        for name, (edge, quality) in IMAGE_VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail((edge, edge), Image.LANCZOS)
+            out = io.BytesIO()
+            variant.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            rendered[name] = out.getvalue()
+    return rendered
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.MEDIA_VARIANT_WORKERS)
+    return _pool
+
+
+def _variant_key_for(image_url: Optional[str]) -> Optional[str]:
+    if not image_url:
+        return None
+    key = get_storage().key_from_url(image_url)
+    return key if key and is_image_key(key) else None
+
+
+async def variant_urls_for(image_url: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Variant URLs for an image this app stored, or None for anything else.
+    Rendered variants are only advertised once they exist; this never
+    waits for a render (see render_in_flight).
+    """
+    key = _variant_key_for(image_url)
+    if key is None:
+        return None
+    storage = get_storage()
+    if not storage.generates_variants:
+        return storage.variant_urls(key)
+    if key in _renders:
+        return None
+    if await storage.exists(storage.variant_key(key, _LAST_VARIANT)) is None:
+        return None
+    return storage.variant_urls(key)
+
+
+def render_in_flight(image_url: Optional[str]) -> Optional[asyncio.Task]:
+    """The variant render still running for this image, if any."""
+    key = _variant_key_for(image_url)
+    return _renders.get(key) if key is not None else None
+
+
+def schedule_variants(stored: StoredObject):
+    """Queue variant generation for a fresh upload without delaying the response."""
+    storage = get_storage()
+    if not storage.generates_variants or not is_image_key(stored.key) or stored.key in _renders:
+        return
+    task = asyncio.create_task(_generate_variants(stored.key))
+    _renders[stored.key] = task
+    task.add_done_callback(lambda _: _renders.pop(stored.key, None))
+
+
+async def _generate_variants(key: str) -> bool:
+    storage = get_storage()
+    try:
+        if await storage.exists(storage.variant_key(key, _LAST_VARIANT)):
+            return True  # duplicate upload, variants already made
+        source = await storage.source_path(key)
+        if source is None:
+            return False
+        rendered = await asyncio.get_running_loop().run_in_executor(_get_pool(), render_variants, source)
+        # Dict order puts _LAST_VARIANT last.
+        for name, data in rendered.items():
+            await storage.save_bytes(storage.variant_key(key, name), data, "image/jpeg")
+        return True
+    except Exception:
+        logger.exception("Generating image variants failed for %s", key)
+        return False
+
+
+async def shutdown_media_pool():
+    if _renders:
+        await asyncio.gather(*_renders.values(), return_exceptions=True)
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
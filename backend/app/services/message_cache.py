@@ -0,0 +1,304 @@
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.schemas.chat_schema import ChatMessageInDB
+from app.websocket.backplane import Backplane, get_backplane
+
+CACHE_CHANNEL = "message-cache"
+
+
+class _RoomBuffer:
+    __slots__ = ("messages", "complete")
+
+    def __init__(self, messages: List[ChatMessageInDB], complete: bool):
+        self.messages: Deque[ChatMessageInDB] = deque(messages)
+        # True when the buffer holds the room's entire history, so a page can
+        # be served even if it is shorter than the requested limit.
+        self.complete = complete
+
+
+class _PendingFill:
+    """Writes seen for a room while its DB read is in flight, merged into fill()."""
+
+    __slots__ = ("room_id", "created", "edited", "deleted")
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.created: Dict[str, ChatMessageInDB] = {}
+        self.edited: Dict[str, ChatMessageInDB] = {}
+        self.deleted: Set[str] = set()
+
+
+class RecentMessageCache:
+    """
+    Per-room ring buffer of the newest messages, used to serve history page
+    one without touching Mongo.
+
+    Rooms are kept in LRU order and evicted once the total number of cached
+    messages exceeds max_messages. Writes are applied through the backplane
+    so every worker's buffers see messages sent on other workers.
+
+    Seeding a room races with sends: a message can be published after the
+    DB read started, or (from another worker's write-behind buffer) before
+    it reached Mongo. Callers wrap the read in begin_fill()/fill(), which
+    merges writes seen in the meantime, and creates for unseeded rooms are
+    remembered for a short window so the second case is merged too.
+    """
+
+    def __init__(
+        self,
+        per_room: int | None = None,
+        max_messages: int | None = None,
+        backplane: Backplane | None = None,
+    ):
+        self.per_room = per_room or settings.RECENT_MESSAGES_PER_ROOM
+        self.max_messages = max_messages or settings.RECENT_MESSAGES_MAX_TOTAL
+        self.backplane = backplane
+        self._rooms: "OrderedDict[str, _RoomBuffer]" = OrderedDict()
+        self._message_rooms: Dict[str, str] = {}
+        self._size = 0
+        self._started = False
+        self._filling: Dict[str, List[_PendingFill]] = {}
+        # (received_at, message) for rooms not seeded here, newest last.
+        self._unseeded: Deque[Tuple[float, ChatMessageInDB]] = deque(maxlen=4096)
+        self.unseeded_window = max(1.0, settings.MESSAGE_WRITE_FLUSH_MS / 1000 * 20)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def start(self):
+        if self._started:
+            return
+        self.backplane = self.backplane or get_backplane()
+        await self.backplane.subscribe(CACHE_CHANNEL, self._on_event)
+        self._started = True
+
+    async def stop(self):
+        if self._started:
+            await self.backplane.unsubscribe(CACHE_CHANNEL)
+            self._started = False
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "rooms": len(self._rooms),
+            "messages": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    # --- reads ---
+
+    def get_page(self, room_id: str, limit: int) -> Optional[List[ChatMessageInDB]]:
+        """Newest `limit` messages in chronological order, or None on a miss."""
+        buf = self._rooms.get(room_id)
+        if buf is None or (len(buf.messages) < limit and not buf.complete):
+            self.misses += 1
+            return None
+        self._rooms.move_to_end(room_id)
+        self.hits += 1
+        if limit >= len(buf.messages):
+            return list(buf.messages)
+        return list(buf.messages)[-limit:]
+
+    def begin_fill(self, room_id: str) -> _PendingFill:
+        """Call before reading a room from the DB; pass the result to fill() or cancel_fill()."""
+        pending = _PendingFill(room_id)
+        self._filling.setdefault(room_id, []).append(pending)
+        return pending
+
+    def cancel_fill(self, pending: _PendingFill):
+        fills = self._filling.get(pending.room_id)
+        if fills and pending in fills:
+            fills.remove(pending)
+            if not fills:
+                del self._filling[pending.room_id]
+
+    def fill(
+        self,
+        room_id: str,
+        messages: List[ChatMessageInDB],
+        complete: bool,
+        pending: _PendingFill | None = None,
+    ) -> List[ChatMessageInDB]:
+        """
+        Seed a room from a DB read of its newest messages (chronological).
+        Returns the messages as cached, i.e. with concurrent writes merged.
+        """
+        if pending is not None:
+            self.cancel_fill(pending)
+            messages = self._merge(room_id, messages, complete, pending)
+        self._drop_room(room_id)
+        if len(messages) > self.per_room:
+            messages = messages[-self.per_room:]
+            complete = False
+        self._rooms[room_id] = _RoomBuffer(messages, complete)
+        for msg in messages:
+            self._message_rooms[msg.id] = room_id
+        self._size += len(messages)
+        self._evict()
+        return messages
+
+    def _merge(
+        self, room_id: str, messages: List[ChatMessageInDB], complete: bool, pending: _PendingFill
+    ) -> List[ChatMessageInDB]:
+        cutoff = time.monotonic() - self.unseeded_window
+        extra = dict(pending.created)
+        for received_at, msg in self._unseeded:
+            if received_at >= cutoff and msg.room_id == room_id:
+                extra.setdefault(msg.id, msg)
+        if not extra and not pending.edited and not pending.deleted:
+            return messages
+
+        merged = {msg.id: msg for msg in messages}
+        oldest = messages[0].created_at if messages else None
+        for msg in extra.values():
+            # Older than the page we read means it belongs further back, not here.
+            if complete or oldest is None or msg.created_at >= oldest:
+                merged.setdefault(msg.id, msg)
+        for message_id, msg in pending.edited.items():
+            if message_id in merged:
+                merged[message_id] = msg
+        for message_id in pending.deleted:
+            merged.pop(message_id, None)
+        return sorted(merged.values(), key=lambda m: (m.created_at, m.id))
+
+    # --- writes (published so every worker applies them) ---
+
+    async def on_message_created(self, msg: ChatMessageInDB):
+        await self._publish({"op": "create", "message": msg.model_dump(mode="json")})
+
+    async def on_message_edited(self, msg: ChatMessageInDB):
+        await self._publish({"op": "edit", "message": msg.model_dump(mode="json")})
+
+    async def on_message_deleted(self, message_id: str):
+        await self._publish({"op": "delete", "id": message_id})
+
+    async def _publish(self, event: dict):
+        if self._started:
+            await self.backplane.publish(CACHE_CHANNEL, event)
+        else:
+            self.apply(event)
+
+    async def _on_event(self, channel: str, event: dict):
+        self.apply(event)
+
+    def apply(self, event: dict):
+        op = event["op"]
+        if op == "create":
+            msg = ChatMessageInDB(**event["message"])
+            for pending in self._filling.get(msg.room_id, ()):
+                pending.created[msg.id] = msg
+            self._append(msg)
+        elif op == "edit":
+            msg = ChatMessageInDB(**event["message"])
+            for pending in self._filling.get(msg.room_id, ()):
+                pending.edited[msg.id] = msg
+            self._replace(msg.id, lambda _: msg)
+            self._replace_unseeded(msg.id, msg)
+        elif op == "delete":
+            message_id = event["id"]
+            for fills in self._filling.values():
+                for pending in fills:
+                    pending.deleted.add(message_id)
+            self._remove(message_id)
+            self._replace_unseeded(message_id, None)
+
+    def _append(self, msg: ChatMessageInDB):
+        buf = self._rooms.get(msg.room_id)
+        if buf is None:
+            # Rooms are only cached once seeded from the DB; otherwise the
+            # buffer could not tell which older messages it is missing.
+            self._unseeded.append((time.monotonic(), msg))
+            return
+        if msg.id in self._message_rooms:
+            return
+        buf.messages.append(msg)
+        if len(buf.messages) > 1 and buf.messages[-2].created_at > msg.created_at:
+            # Arrived out of order from another worker.
+            buf.messages = deque(sorted(buf.messages, key=lambda m: (m.created_at, m.id)))
+        self._message_rooms[msg.id] = msg.room_id
+        self._size += 1
+        if len(buf.messages) > self.per_room:
+            old = buf.messages.popleft()
+            self._message_rooms.pop(old.id, None)
+            self._size -= 1
+            buf.complete = False
+        self._evict()
+
+    def _replace(self, message_id: str, update):
+        room_id = self._message_rooms.get(message_id)
+        buf = self._rooms.get(room_id) if room_id else None
+        if buf is None:
+            return
+        for i, cached in enumerate(buf.messages):
+            if cached.id == message_id:
+                buf.messages[i] = update(cached)
+                return
+
+    def _replace_unseeded(self, message_id: str, msg: Optional[ChatMessageInDB]):
+        for i, (received_at, cached) in enumerate(self._unseeded):
+            if cached.id == message_id:
+                if msg is None:
+                    del self._unseeded[i]
+                else:
+                    self._unseeded[i] = (received_at, msg)
+                return
+
+    def _remove(self, message_id: str):
+        room_id = self._message_rooms.pop(message_id, None)
+        buf = self._rooms.get(room_id) if room_id else None
+        if buf is None:
+            return
+        for cached in buf.messages:
+            if cached.id == message_id:
+                buf.messages.remove(cached)
+                self._size -= 1
+                return
+
+    def invalidate(self, room_id: str):
+        self._drop_room(room_id)
+
+    def _drop_room(self, room_id: str):
+        buf = self._rooms.pop(room_id, None)
+        if buf is None:
+            return
+        for msg in buf.messages:
+            self._message_rooms.pop(msg.id, None)
+        self._size -= len(buf.messages)
+
+    def _evict(self):
+        while self._size > self.max_messages and len(self._rooms) > 1:
+            room_id = next(iter(self._rooms))
+            self._drop_room(room_id)
+            self.evictions += 1
+
+
+message_cache = RecentMessageCache()
+
+metrics.Gauge(
+    "chatsphere_message_cache_rooms", "Rooms with a recent-message buffer.",
+    lambda: message_cache.stats()["rooms"],
+)
+metrics.Gauge(
+    "chatsphere_message_cache_messages", "Messages held in recent-message buffers.",
+    lambda: message_cache.stats()["messages"],
+)
+metrics.CallbackCounter(
+    "chatsphere_message_cache_hits_total", "History page-one reads served from memory.",
+    lambda: message_cache.hits,
+)
+metrics.CallbackCounter(
+    "chatsphere_message_cache_misses_total", "History page-one reads that went to Mongo.",
+    lambda: message_cache.misses,
+)
+metrics.CallbackCounter(
+    "chatsphere_message_cache_evictions_total", "Room buffers evicted for space.",
+    lambda: message_cache.evictions,
+)
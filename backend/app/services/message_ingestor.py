@@ -0,0 +1,246 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Set
+
+import bson
+from bson.errors import InvalidDocument
+from pymongo.errors import BulkWriteError
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.chat_model import apply_room_activity, build_message_doc, insert_messages, message_helper
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the wait between retries of a failing document.
+RETRY_BACKOFF_MAX_SECONDS = 5.0
+
+
+class MessageIngestor:
+    """
+    Write-behind buffer for new chat messages.
+
+    Documents get their ObjectId and created_at locally, so callers can
+    broadcast immediately; the buffer is flushed to Mongo with insert_many
+    once it reaches batch_size or flush_interval seconds have passed.
+    Callers that need the write acknowledged pass durable=True and wait for
+    the batch containing their message to be written.
+
+    Documents are BSON-encoded once in submit(), so one that can never be
+    stored is rejected to the sender instead of poisoning a batch. When a
+    flush fails, only the documents that were not written are retried, with
+    exponential backoff and behind newer traffic; after
+    MESSAGE_WRITE_MAX_ATTEMPTS they are logged and dropped. Because _ids are
+    assigned before the first attempt, a retry of a document that did make it
+    in is reported as a duplicate key and ignored.
+    """
+
+    def __init__(self, batch_size: int | None = None, flush_interval: float | None = None):
+        self.batch_size = batch_size or settings.MESSAGE_WRITE_BATCH_SIZE
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else settings.MESSAGE_WRITE_FLUSH_MS / 1000
+        )
+        self.max_attempts = settings.MESSAGE_WRITE_MAX_ATTEMPTS
+        self._pending: List[Dict[str, Any]] = []
+        # Failed documents waiting out their backoff, and attempts per _id.
+        self._retry: List[Dict[str, Any]] = []
+        self._retry_at = 0.0
+        self._attempts: Dict[Any, int] = {}
+        self._waiters: Dict[Any, asyncio.Future] = {}
+        self._pending_ids: Set[str] = set()
+        self._pending_rooms: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        # Background flushes and retries; asyncio only holds weak references.
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.flushed_batches = 0
+        self.flushed_messages = 0
+        self.failed_flushes = 0
+        self.dropped_messages = 0
+
+    async def submit(
+        self,
+        room_id: str,
+        sender_id: str,
+        content: str,
+        image_url: str = None,
+        durable: bool = False,
+        image_variants: Dict[str, str] | None = None,
+    ) -> Dict[str, Any]:
+        doc = build_message_doc(room_id, sender_id, content, image_url, image_variants)
+        try:
+            bson.encode(doc)
+        except (InvalidDocument, UnicodeEncodeError, OverflowError) as e:
+            raise ValueError(f"Message cannot be stored: {e}") from e
+        waiter = None
+        if durable:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[doc["_id"]] = waiter
+
+        self._pending.append(doc)
+        self._pending_ids.add(str(doc["_id"]))
+        self._pending_rooms[room_id] = self._pending_rooms.get(room_id, 0) + 1
+
+        if len(self._pending) >= self.batch_size:
+            self._spawn(self.flush())
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+        if waiter is not None:
+            await waiter
+        return message_helper(doc)
+
+    async def flush_if_pending(self, message_id: str):
+        """Make sure a buffered message is in Mongo before it is read or modified."""
+        if message_id in self._pending_ids:
+            await self.flush()
+
+    async def flush_room(self, room_id: str):
+        if self._pending_rooms.get(room_id):
+            await self.flush()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # Messages submitted while this flush runs need a timer of their own.
+        self._timer = None
+        # Shielded so stop() cancelling the timer cannot abandon a swapped-out batch.
+        await asyncio.shield(self._spawn(self.flush()))
+
+    async def flush(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            due = bool(self._retry) and loop.time() >= self._retry_at
+            if not self._pending and not due:
+                return
+            batch, self._pending = self._pending, []
+            if due:
+                batch, self._retry = self._retry + batch, []
+
+            error = None
+            failed: List[Dict[str, Any]] = []
+            try:
+                await insert_messages(batch)
+            except BulkWriteError as e:
+                # ordered=False: everything not listed (or a duplicate key) was written.
+                error = e
+                indexes = {
+                    err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000
+                }
+                failed = [batch[i] for i in sorted(indexes)]
+            except Exception as e:
+                error = e
+                failed = batch
+
+            if failed:
+                self.failed_flushes += 1
+                logger.error(
+                    "Message batch flush failed for %d of %d messages: %s", len(failed), len(batch), error
+                )
+                self._schedule_retry(failed, error)
+
+            failed_ids = {doc["_id"] for doc in failed}
+            written = [doc for doc in batch if doc["_id"] not in failed_ids]
+            if not written:
+                return
+            self.flushed_batches += 1
+            self.flushed_messages += len(written)
+            for doc in written:
+                self._forget(doc)
+                self._attempts.pop(doc["_id"], None)
+                waiter = self._waiters.pop(doc["_id"], None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+
+            try:
+                # Room summaries (last message, unread counters) follow the batch.
+                await apply_room_activity(written)
+            except Exception:
+                logger.exception("Updating room activity failed for a batch of %d messages", len(written))
+
+    def _schedule_retry(self, failed: List[Dict[str, Any]], error: Exception):
+        # Acknowledged callers get the error right away; the rest are retried.
+        retry = []
+        for doc in failed:
+            waiter = self._waiters.pop(doc["_id"], None)
+            if waiter is not None:
+                self._forget(doc)
+                self._attempts.pop(doc["_id"], None)
+                if not waiter.done():
+                    waiter.set_exception(error)
+                continue
+            attempts = self._attempts.get(doc["_id"], 0) + 1
+            if attempts >= self.max_attempts:
+                self._forget(doc)
+                self._attempts.pop(doc["_id"], None)
+                self.dropped_messages += 1
+                logger.error(
+                    "Dropping message %s for room %s after %d failed writes",
+                    doc["_id"], doc["room_id"], attempts,
+                )
+                continue
+            self._attempts[doc["_id"]] = attempts
+            retry.append(doc)
+        if not retry:
+            return
+
+        self._retry.extend(retry)
+        attempts = max(self._attempts[doc["_id"]] for doc in self._retry)
+        delay = min(max(self.flush_interval, 0.01) * 2 ** attempts, RETRY_BACKOFF_MAX_SECONDS)
+        self._retry_at = asyncio.get_running_loop().time() + delay
+        self._spawn(self._retry_later(delay))
+
+    async def _retry_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await asyncio.shield(self._spawn(self.flush()))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background message flush failed", exc_info=task.exception())
+
+    def _forget(self, doc: Dict[str, Any]):
+        self._pending_ids.discard(str(doc["_id"]))
+        room_id = str(doc["room_id"])
+        remaining = self._pending_rooms.get(room_id, 0) - 1
+        if remaining > 0:
+            self._pending_rooms[room_id] = remaining
+        else:
+            self._pending_rooms.pop(room_id, None)
+
+    async def stop(self):
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        # One last attempt for anything still backing off.
+        self._retry_at = 0.0
+        await self.flush()
+
+
+message_ingestor = MessageIngestor()
+
+metrics.Gauge(
+    "chatsphere_message_ingest_queue", "Messages buffered for the next flush, including retries.",
+    lambda: len(message_ingestor._pending) + len(message_ingestor._retry),
+)
+metrics.Gauge(
+    "chatsphere_message_ingest_retrying", "Messages waiting to retry a failed write.",
+    lambda: len(message_ingestor._retry),
+)
+metrics.CallbackCounter(
+    "chatsphere_message_ingest_flushed_total", "Messages written by the ingestor.",
+    lambda: message_ingestor.flushed_messages,
+)
+metrics.CallbackCounter(
+    "chatsphere_message_ingest_failed_flushes_total", "Flushes with at least one failed write.",
+    lambda: message_ingestor.failed_flushes,
+)
+metrics.CallbackCounter(
+    "chatsphere_message_ingest_dropped_total", "Messages dropped after exhausting retries.",
+    lambda: message_ingestor.dropped_messages,
+)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.models.chat_model import advance_read_watermarks, find_message_room_ids, refresh_unread_counts
+from app.services.message_ingestor import message_ingestor
+
+logger = logging.getLogger(__name__)
+
+# Ids are minted by this server, so anything stamped later than this is forged.
+MAX_CLOCK_SKEW = timedelta(minutes=1)
+
+# Called once per room per flush with [(user_id, last_read_message_id), ...]
+ReceiptListener = Callable[[str, List[Tuple[str, str]]], Awaitable[None]]
+
+
+class ReadReceiptAggregator:
+    """
+    Coalesces "read" events into per-(room, user) watermarks.
+
+    Opening a room with hundreds of unread messages used to mean one DB
+    write and one broadcast per message. Here every read just raises the
+    pending watermark in memory; after flush_interval the pending
+    watermarks are written in one bulk_write and each room gets a single
+    aggregated read_receipt event.
+
+    Watermarks only ever move forward, so a message id from another room or
+    one from the future would pin a watermark for good. Ids stamped in the
+    future are refused outright; the rest are checked against their room
+    with one query per flush before anything is written.
+    """
+
+    def __init__(self, flush_interval: float | None = None):
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else settings.READ_RECEIPT_FLUSH_MS / 1000
+        )
+        self._pending: Dict[Tuple[str, str], ObjectId] = {}
+        self._listeners: List[ReceiptListener] = []
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    def add_listener(self, listener: ReceiptListener):
+        self._listeners.append(listener)
+
+    def mark_read(self, room_id: str, user_id: str, message_id: str) -> bool:
+        try:
+            oid = ObjectId(message_id)
+        except Exception:
+            return False
+        if oid.generation_time > datetime.now(timezone.utc) + MAX_CLOCK_SKEW:
+            return False
+        key = (room_id, user_id)
+        current = self._pending.get(key)
+        if current is None or oid > current:
+            self._pending[key] = oid
+        self._schedule()
+        return True
+
+    def _schedule(self):
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # Reads marked while this flush runs need a timer of their own.
+        self._timer = None
+        await asyncio.shield(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                batch = await self._verified(batch)
+            except Exception:
+                logger.exception("Verifying read watermarks failed, %d entries re-queued", len(batch))
+                self._requeue(batch)
+                return
+            if not batch:
+                return
+            watermarks = [(room_id, user_id, str(oid)) for (room_id, user_id), oid in batch.items()]
+            try:
+                await advance_read_watermarks(watermarks)
+            except Exception:
+                logger.exception("Read watermark flush failed, %d entries re-queued", len(batch))
+                self._requeue(batch)
+                return
+            try:
+                await refresh_unread_counts(watermarks)
+            except Exception:
+                logger.exception("Refreshing unread counts failed")
+
+        by_room: Dict[str, List[Tuple[str, str]]] = {}
+        for (room_id, user_id), oid in batch.items():
+            by_room.setdefault(room_id, []).append((user_id, str(oid)))
+        for room_id, receipts in by_room.items():
+            for listener in self._listeners:
+                try:
+                    await listener(room_id, receipts)
+                except Exception:
+                    logger.exception("Read receipt listener failed for room %s", room_id)
+
+    async def _verified(self, batch: Dict[Tuple[str, str], ObjectId]) -> Dict[Tuple[str, str], ObjectId]:
+        """Drop watermarks whose message doesn't exist in the room they were reported for."""
+        message_ids = {str(oid) for oid in batch.values()}
+        # Freshly sent messages may still be in the write-behind buffer.
+        for message_id in message_ids:
+            await message_ingestor.flush_if_pending(message_id)
+        rooms = await find_message_room_ids(list(message_ids))
+        verified = {}
+        for (room_id, user_id), oid in batch.items():
+            if rooms.get(str(oid)) == room_id:
+                verified[(room_id, user_id)] = oid
+            else:
+                logger.warning("Ignoring read watermark %s for room %s from user %s", oid, room_id, user_id)
+        return verified
+
+    def _requeue(self, batch: Dict[Tuple[str, str], ObjectId]):
+        for key, oid in batch.items():
+            if key not in self._pending or oid > self._pending[key]:
+                self._pending[key] = oid
+        self._schedule()
+
+    async def stop(self):
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        await self.flush()
+
+
+read_receipts = ReadReceiptAggregator()
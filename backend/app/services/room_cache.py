@@ -0,0 +1,122 @@
+import asyncio
+import sys
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.chat_model import find_room_participants
+from app.utils.ttl_cache import TTLCache
+from app.websocket.backplane import Backplane, get_backplane
+
+INVALIDATION_CHANNEL = "room-cache"
+
+_NO_MEMBERS: FrozenSet[str] = frozenset()
+
+
+class RoomMembershipCache:
+    """
+    TTL+LRU cache of room_id -> participant set for authorization checks.
+
+    The WebSocket endpoint checks membership on connect and again on every
+    action, so this has to be a dict lookup in the common case. One frozenset
+    is stored per room and shared by every socket in it; unknown rooms are
+    cached as empty sets so probing random ids doesn't hit Mongo each time.
+    Concurrent misses for the same room share a single query.
+
+    Anything that changes a room's participants must call invalidate();
+    the ids are published on the backplane so every worker drops its copy.
+    """
+
+    def __init__(self, backplane: Backplane | None = None):
+        self._cache = TTLCache(settings.ROOM_CACHE_MAX_ENTRIES, settings.ROOM_CACHE_TTL_SECONDS)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.backplane = backplane
+        self._started = False
+
+    async def start(self):
+        if self._started:
+            return
+        self.backplane = self.backplane or get_backplane()
+        await self.backplane.subscribe(INVALIDATION_CHANNEL, self._on_invalidate)
+        self._started = True
+
+    async def stop(self):
+        if self._started:
+            await self.backplane.unsubscribe(INVALIDATION_CHANNEL)
+            self._started = False
+
+    async def get_members(self, room_id: str) -> FrozenSet[str]:
+        members = self._cache.get(room_id)
+        if members is not None:
+            return members
+
+        pending = self._loading.get(room_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[room_id] = future
+        try:
+            participants = await find_room_participants(room_id)
+            members = _NO_MEMBERS if participants is None else self._freeze(participants)
+            # An invalidation while we were loading means this read may be stale.
+            if self._loading.get(room_id) is future:
+                self._cache.set(room_id, members)
+            future.set_result(members)
+            return members
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            if self._loading.get(room_id) is future:
+                del self._loading[room_id]
+
+    def peek(self, room_id: str) -> Optional[FrozenSet[str]]:
+        """Cached members only, never loading; for hot loops that can skip a miss."""
+        return self._cache.get(room_id)
+
+    async def is_member(self, room_id: str, user_id: str) -> bool:
+        return user_id in await self.get_members(room_id)
+
+    def set(self, room_id: str, participants: Iterable[str]):
+        """Prime the cache with a room that was just written."""
+        self._cache.set(room_id, self._freeze(participants))
+
+    async def invalidate(self, *room_ids: str):
+        # Drop locally right away (a broker round trip may lag), then tell the other workers.
+        self.drop(*room_ids)
+        if self._started:
+            await self.backplane.publish(INVALIDATION_CHANNEL, {"ids": list(room_ids)})
+
+    def drop(self, *room_ids: str):
+        for room_id in room_ids:
+            self._cache.pop(room_id)
+            self._loading.pop(room_id, None)
+
+    async def _on_invalidate(self, channel: str, event: dict):
+        self.drop(*event.get("ids", []))
+
+    @staticmethod
+    def _freeze(participants: Iterable[str]) -> FrozenSet[str]:
+        # The same user ids show up in many rooms; keep one copy of each string.
+        return frozenset(sys.intern(str(p)) for p in participants)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+room_members = RoomMembershipCache()
+
+metrics.Gauge(
+    "chatsphere_room_cache_entries", "Rooms in the membership cache.",
+    lambda: room_members.stats()["size"],
+)
+metrics.CallbackCounter(
+    "chatsphere_room_cache_hits_total", "Membership lookups served from cache.",
+    lambda: room_members.stats()["hits"],
+)
+metrics.CallbackCounter(
+    "chatsphere_room_cache_misses_total", "Membership lookups that missed the cache.",
+    lambda: room_members.stats()["misses"],
+)
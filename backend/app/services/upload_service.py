@@ -0,0 +1,193 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from typing import BinaryIO, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import settings
+from app.storage import StoredObject, get_storage
+from app.storage.base import is_image_key
+
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class _HashingSpool:
+    """Temp file that hashes and size-checks every chunk as it is written."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.file: BinaryIO = tempfile.TemporaryFile()
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the {self.max_bytes} byte upload limit")
+        self.sha256.update(chunk)
+        await run_in_threadpool(self.file.write, chunk)
+
+    def close(self):
+        self.file.close()
+
+
+class _FilePartReader:
+    """
+    Incremental multipart parser that forwards the bytes of the first file
+    part named `field` as they arrive, instead of spooling the whole form
+    before the handler runs.
+    """
+
+    def __init__(self, boundary: bytes, field: str):
+        self.field = field.encode()
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.found = False
+        self._chunks: List[bytes] = []
+        self._headers: dict = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+        self._done = False
+        self.parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Parse a chunk and return the file bytes it contained."""
+        self.parser.write(chunk)
+        data, self._chunks = self._chunks, []
+        return data
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if self._done or options.get(b"name") != self.field or b"filename" not in options:
+            return
+        self._in_file = True
+        self.found = True
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        self.content_type = self._headers.get(b"content-type", b"").decode() or None
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._chunks.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._done = True
+
+
+def _is_decodable_image(fileobj: BinaryIO) -> bool:
+    """Header-level check that Pillow can read the file; cheap next to rendering it."""
+    from PIL import Image
+
+    fileobj.seek(0)
+    try:
+        with Image.open(fileobj) as image:
+            image.verify()
+    except Exception:
+        return False
+    return True
+
+
+def _extension(filename: Optional[str], content_type: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if _EXTENSION_RE.match(ext):
+        return ext
+    guessed = mimetypes.guess_extension(content_type or "") or ""
+    return guessed if _EXTENSION_RE.match(guessed) else ""
+
+
+async def receive_upload(request: Request, field: str = "file") -> StoredObject:
+    """
+    Stream a multipart (or raw-body) upload to a temp file in chunks,
+    enforcing UPLOAD_MAX_BYTES as bytes arrive, then store it under its
+    SHA-256 so identical files are only stored once. Files with an image
+    extension must open as images, since variants are rendered from them.
+    """
+    max_bytes = settings.UPLOAD_MAX_BYTES
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + 64 * 1024:
+        # Reject before reading a byte; 64 KiB leaves room for multipart framing.
+        raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+
+    ctype, options = parse_options_header(request.headers.get("content-type", ""))
+    reader = None
+    if ctype == b"multipart/form-data":
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise UploadError("Missing multipart boundary")
+        reader = _FilePartReader(boundary, field)
+
+    spool = _HashingSpool(max_bytes)
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            for data in reader.feed(chunk) if reader else (chunk,):
+                await spool.write(data)
+
+        if reader is not None:
+            reader.parser.finalize()
+            if not reader.found:
+                raise UploadError(f"No file field named '{field}' in upload")
+            filename, content_type = reader.filename, reader.content_type
+        else:
+            filename, content_type = request.query_params.get("filename"), ctype.decode() or None
+        if spool.size == 0:
+            raise UploadError("Uploaded file is empty")
+
+        key = spool.sha256.hexdigest() + _extension(filename, content_type)
+        if is_image_key(key) and not await run_in_threadpool(_is_decodable_image, spool.file):
+            raise UploadError("File is not a readable image")
+        storage = get_storage()
+        url = await storage.exists(key)
+        if url is not None:
+            return StoredObject(key=key, url=url, size=spool.size, content_type=content_type, deduplicated=True)
+
+        await run_in_threadpool(spool.file.seek, 0)
+        url = await storage.save(key, spool.file, spool.size, content_type)
+        return StoredObject(key=key, url=url, size=spool.size, content_type=content_type)
+    finally:
+        spool.close()
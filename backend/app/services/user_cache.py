@@ -0,0 +1,112 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.user_model import find_user_by_id
+from app.schemas.user_schema import UserInDB
+from app.utils.ttl_cache import TTLCache
+from app.websocket.backplane import Backplane, get_backplane
+
+INVALIDATION_CHANNEL = "user-cache"
+
+
+class UserCache:
+    """
+    TTL+LRU cache of UserInDB records for get_current_user.
+
+    Anything that changes a user's session salt or friend list must call
+    invalidate(); the ids are published on the backplane so every worker
+    drops its copy, which keeps session revocation immediate. The TTL only
+    bounds staleness if an invalidation is ever lost. Reads go through
+    load(), which won't cache a record that was invalidated while it was
+    being fetched (it may carry a revoked salt).
+    """
+
+    def __init__(self, backplane: Backplane | None = None):
+        self._cache = TTLCache(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL_SECONDS)
+        self.backplane = backplane
+        self._started = False
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    async def start(self):
+        if self._started:
+            return
+        self.backplane = self.backplane or get_backplane()
+        await self.backplane.subscribe(INVALIDATION_CHANNEL, self._on_invalidate)
+        self._started = True
+
+    async def stop(self):
+        if self._started:
+            await self.backplane.unsubscribe(INVALIDATION_CHANNEL)
+            self._started = False
+
+    def add_listener(self, listener: Callable[[List[str]], None]):
+        """Called with the ids of every invalidation, local or from another worker."""
+        self._listeners.append(listener)
+
+    def get(self, user_id: str) -> Optional[UserInDB]:
+        return self._cache.get(user_id)
+
+    def set(self, user: UserInDB):
+        self._cache.set(user.id, user)
+
+    async def load(self, user_id: str) -> Optional[UserInDB]:
+        """Fetch from the DB (ignoring any cached copy) and cache the result; concurrent loads share one query."""
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            doc = await find_user_by_id(user_id)
+            user = UserInDB(**doc) if doc else None
+            # An invalidation while we were loading means this read may be stale.
+            if user is not None and self._loading.get(user_id) is future:
+                self._cache.set(user_id, user)
+            future.set_result(user)
+            return user
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            if self._loading.get(user_id) is future:
+                del self._loading[user_id]
+
+    async def invalidate(self, *user_ids: str):
+        # Drop locally right away (a broker round trip may lag), then tell the other workers.
+        self.drop(*user_ids)
+        if self._started:
+            await self.backplane.publish(INVALIDATION_CHANNEL, {"ids": list(user_ids)})
+
+    def drop(self, *user_ids: str):
+        for user_id in user_ids:
+            self._cache.pop(user_id)
+            self._loading.pop(user_id, None)
+        for listener in self._listeners:
+            listener(list(user_ids))
+
+    async def _on_invalidate(self, channel: str, event: dict):
+        self.drop(*event.get("ids", []))
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+user_cache = UserCache()
+
+metrics.Gauge(
+    "chatsphere_user_cache_entries", "Users in the authenticated-user cache.",
+    lambda: user_cache.stats()["size"],
+)
+metrics.CallbackCounter(
+    "chatsphere_user_cache_hits_total", "Authenticated-user lookups served from cache.",
+    lambda: user_cache.stats()["hits"],
+)
+metrics.CallbackCounter(
+    "chatsphere_user_cache_misses_total", "Authenticated-user lookups that missed the cache.",
+    lambda: user_cache.stats()["misses"],
+)
@@ -1,7 +1,16 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from app.models.user_model import find_user_by_id, find_user_by_email, get_user_collection
-from app.schemas.user_schema import UserInDB, UserPublic
+from app.core.config import settings
+from app.models.user_model import (
+    find_user_by_id,
+    find_user_by_email,
+    find_users_by_prefix,
+    find_users_page,
+    find_users_by_trigrams,
+    normalize_username,
+)
+from app.schemas.user_schema import UserCompact, UserInDB, UserPublic
+from app.utils.ttl_cache import TTLCache
 
 
 async def get_user_by_id(user_id: str) -> Optional[UserInDB]:
@@ -14,23 +23,63 @@ async def get_user_by_email(email: str) -> Optional[UserInDB]:
     return UserInDB(**doc) if doc else None
 
 
-async def list_users() -> List[UserPublic]:
-    col = await get_user_collection()
-    cursor = col.find({})
-    docs = await cursor.to_list(length=1000)
-    users = [
-        UserPublic(id=str(d["_id"]), email=d["email"], username=d["username"])
-        for d in docs
-    ]
-    return users
-
-
-async def search_users(query: str) -> List[UserPublic]:
-    col = await get_user_collection()
-    cursor = col.find({"username": {"$regex": query, "$options": "i"}})
-    docs = await cursor.to_list(length=100)
-    users = [
-        UserPublic(id=str(d["_id"]), email=d["email"], username=d["username"])
-        for d in docs
-    ]
-    return users
+async def list_users(
+    limit: int = 100, after: Optional[str] = None, compact: bool = False
+) -> List[UserPublic] | List[UserCompact]:
+    docs = await find_users_page(limit, after=after, compact=compact)
+    model = UserCompact if compact else UserPublic
+    return [model(**d) for d in docs]
+
+
+# normalized prefix -> (alphabetical matches, whether that is every match)
+_search_cache = TTLCache(settings.USER_SEARCH_CACHE_MAX_ENTRIES, settings.USER_SEARCH_CACHE_TTL_SECONDS)
+
+
+async def _prefix_candidates(prefix: str) -> Tuple[List[dict], bool]:
+    cached = _search_cache.get(prefix)
+    if cached is not None:
+        return cached
+    # While someone types, a shorter prefix whose cached result was complete
+    # already holds every match: filter it instead of asking Mongo again.
+    for n in range(len(prefix) - 1, 0, -1):
+        shorter = _search_cache.get(prefix[:n])
+        if shorter is not None and shorter[1]:
+            result = ([u for u in shorter[0] if normalize_username(u["username"]).startswith(prefix)], True)
+            _search_cache.set(prefix, result)
+            return result
+
+    cap = settings.USER_SEARCH_CANDIDATES
+    users = await find_users_by_prefix(prefix, cap)
+    result = (users, len(users) < cap)
+    _search_cache.set(prefix, result)
+    return result
+
+
+async def search_users(
+    query: str, current_user: UserInDB, limit: int = 20, fuzzy: bool = False
+) -> List[UserPublic]:
+    """
+    Username autocomplete: indexed prefix matches with the caller's friends
+    first, then optionally fuzzy (trigram) matches to fill the page.
+    New users show up within USER_SEARCH_CACHE_TTL_SECONDS.
+    """
+    prefix = normalize_username(query)
+    if not prefix:
+        return []
+
+    candidates, complete = await _prefix_candidates(prefix)
+    friends = set(current_user.friends)
+    if not friends:
+        ranked = candidates[:limit]
+    else:
+        if complete:
+            friend_hits = [u for u in candidates if u["id"] in friends]
+        else:
+            # Friends may sort outside the cached window; look them up directly.
+            friend_hits = await find_users_by_prefix(prefix, limit, user_ids=list(friends))
+        seen = {u["id"] for u in friend_hits}
+        ranked = (friend_hits + [u for u in candidates if u["id"] not in seen])[:limit]
+
+    if fuzzy and len(ranked) < limit and len(prefix) >= 3:
+        ranked += await find_users_by_trigrams(prefix, limit - len(ranked), [u["id"] for u in ranked])
+    return [UserPublic(**u) for u in ranked]
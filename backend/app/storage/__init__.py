@@ -0,0 +1,32 @@
+from app.core.config import settings
+
+from .base import StorageBackend, StoredObject
+
+_storage: StorageBackend | None = None
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+def create_storage() -> StorageBackend:
+    kind = settings.STORAGE_BACKEND.lower()
+    if kind == "local":
+        from .local import LocalStorage
+
+        return LocalStorage(settings.UPLOAD_DIR, settings.UPLOAD_PUBLIC_BASE_URL + settings.UPLOAD_URL_PATH)
+    if kind == "cloudinary":
+        from .cloudinary_storage import CloudinaryStorage
+
+        return CloudinaryStorage(
+            settings.CLOUDINARY_CLOUD_NAME,
+            settings.CLOUDINARY_API_KEY,
+            settings.CLOUDINARY_API_SECRET,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND '{settings.STORAGE_BACKEND}'")
+
+
+__all__ = ["StorageBackend", "StoredObject", "get_storage", "create_storage"]
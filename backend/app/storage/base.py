@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Optional
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+# Display variants: name -> (longest edge in px, JPEG quality)
+IMAGE_VARIANTS: Dict[str, tuple] = {
+    "thumb": (160, 70),
+    "preview": (640, 80),
+    "full": (1600, 85),
+}
+
+
+@dataclass
+class StoredObject:
+    key: str
+    url: str
+    size: int
+    content_type: Optional[str] = None
+    deduplicated: bool = False
+
+
+class StorageBackend:
+    """
+    Where uploaded media ends up. Keys are content hashes plus extension,
+    so identical uploads map to the same object and are stored once.
+    Implementations must not block the event loop.
+    """
+
+    async def exists(self, key: str) -> Optional[str]:
+        """
+        Return the public URL if an object with this key is known to be
+        stored. May return None for a stored object, so save() must accept
+        a key that already exists.
+        """
+        raise NotImplementedError
+
+    async def save(self, key: str, fileobj: BinaryIO, size: int, content_type: Optional[str]) -> str:
+        """Store the (rewound) file under key and return its public URL."""
+        raise NotImplementedError
+
+    def url_for(self, key: str) -> str:
+        raise NotImplementedError
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        """Reverse of url_for, or None if the URL was not issued by this backend."""
+        raise NotImplementedError
+
+    # Variants are stored next to the original as <hash>_<variant>.jpg.
+    # Backends that resize on the fly (Cloudinary) override both methods and
+    # set generates_variants = False, so no processing stage runs for them.
+    generates_variants = True
+
+    def variant_key(self, key: str, variant: str) -> str:
+        return f"{key.rsplit('.', 1)[0]}_{variant}.jpg"
+
+    def variant_urls(self, key: str) -> Optional[Dict[str, str]]:
+        if not is_image_key(key):
+            return None
+        return {name: self.url_for(self.variant_key(key, name)) for name in IMAGE_VARIANTS}
+
+    async def source_path(self, key: str) -> Optional[str]:
+        """Local filesystem path of a stored object, for backends that have one."""
+        return None
+
+    async def save_bytes(self, key: str, data: bytes, content_type: Optional[str]) -> str:
+        raise NotImplementedError
+
+
+def is_image_key(key: str) -> bool:
+    dot = key.rfind(".")
+    return dot != -1 and key[dot:].lower() in IMAGE_EXTENSIONS
@@ -0,0 +1,69 @@
+import os
+import re
+from typing import BinaryIO, Dict, Optional
+
+import cloudinary
+import cloudinary.uploader
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.utils.ttl_cache import TTLCache
+
+from .base import IMAGE_VARIANTS, StorageBackend, is_image_key
+
+_UPLOAD_URL_RE = re.compile(r"/image/upload/(?:v\d+/)?(?P<public_id>[^.]+)(?P<ext>\.[A-Za-z0-9]+)?$")
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Cloudinary adapter. The SDK is synchronous, so every call runs in the threadpool.
+
+    Dedup never asks the (rate-limited) Admin API: the public_id is derived
+    from the content hash and uploads use overwrite=False, so re-uploading
+    a file Cloudinary already has returns the existing asset. Recently seen
+    keys are remembered so repeats skip the upload entirely.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, folder: str = "chatsphere"):
+        # Configured once, not on every request.
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self.folder = folder
+        self._known = TTLCache(settings.UPLOAD_KEY_CACHE_MAX_ENTRIES, settings.UPLOAD_KEY_CACHE_TTL_SECONDS)
+
+    def _public_id(self, key: str) -> str:
+        return f"{self.folder}/{os.path.splitext(key)[0]}"
+
+    def url_for(self, key: str) -> str:
+        return self._known.get(key) or cloudinary.CloudinaryImage(self._public_id(key)).build_url()
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        match = _UPLOAD_URL_RE.search(url or "")
+        if match is None or not match.group("public_id").startswith(self.folder + "/"):
+            return None
+        return match.group("public_id")[len(self.folder) + 1:] + (match.group("ext") or "")
+
+    # Cloudinary resizes on delivery, so variants are just transformation URLs.
+    generates_variants = False
+
+    def variant_urls(self, key: str) -> Optional[Dict[str, str]]:
+        if not is_image_key(key):
+            return None
+        image = cloudinary.CloudinaryImage(self._public_id(key))
+        return {
+            name: image.build_url(width=edge, height=edge, crop="limit", quality=quality, fetch_format="auto")
+            for name, (edge, quality) in IMAGE_VARIANTS.items()
+        }
+
+    async def exists(self, key: str) -> Optional[str]:
+        return self._known.get(key)
+
+    async def save(self, key: str, fileobj: BinaryIO, size: int, content_type: Optional[str]) -> str:
+        result = await run_in_threadpool(
+            cloudinary.uploader.upload,
+            fileobj,
+            public_id=self._public_id(key),
+            resource_type="auto",
+            overwrite=False,
+        )
+        self._known.set(key, result["secure_url"])
+        return result["secure_url"]
@@ -0,0 +1,58 @@
+import io
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .base import StorageBackend
+
+
+class LocalStorage(StorageBackend):
+    """Filesystem backend, served by the app's static mount. Used in tests and local dev."""
+
+    def __init__(self, root: str, url_prefix: str):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        prefix = self.url_prefix + "/"
+        if not url or not url.startswith(prefix):
+            return None
+        key = url[len(prefix):]
+        return key if key and "/" not in key and not key.startswith(".") else None
+
+    async def source_path(self, key: str) -> Optional[str]:
+        return self.path_for(key)
+
+    async def save_bytes(self, key: str, data: bytes, content_type: Optional[str]) -> str:
+        await run_in_threadpool(self._write, key, io.BytesIO(data))
+        return self.url_for(key)
+
+    async def exists(self, key: str) -> Optional[str]:
+        found = await run_in_threadpool(os.path.exists, self.path_for(key))
+        return self.url_for(key) if found else None
+
+    async def save(self, key: str, fileobj: BinaryIO, size: int, content_type: Optional[str]) -> str:
+        await run_in_threadpool(self._write, key, fileobj)
+        return self.url_for(key)
+
+    def _write(self, key: str, fileobj: BinaryIO):
+        # Write to a temp file and rename so readers never see a partial object.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(fileobj, out)
+            os.replace(tmp_path, self.path_for(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
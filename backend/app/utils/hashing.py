@@ -1,5 +1,12 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
 from passlib.context import CryptContext
 
+from app.core import metrics
+from app.core.config import settings
+
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
 
@@ -9,3 +16,107 @@ def hash_password(password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+
+# --- Off-loop hashing ---
+# Argon2 takes tens of milliseconds of CPU per call. Running it inline in an
+# async handler blocks every other request and WebSocket on the worker, so
+# the async variants below run it in a bounded pool instead.
+
+class HashPoolStats:
+    def __init__(self):
+        self.queued = 0
+        self.in_flight = 0
+        self.started = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "avg_wait_ms": (self.total_wait / self.started * 1000) if self.started else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+hash_pool_stats = HashPoolStats()
+_executor: Executor | None = None
+_slots: asyncio.Semaphore | None = None
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if settings.HASH_POOL_KIND == "process":
+            _executor = ProcessPoolExecutor(max_workers=settings.HASH_POOL_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.HASH_POOL_WORKERS, thread_name_prefix="argon2"
+            )
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.HASH_MAX_CONCURRENCY)
+    return _slots
+
+
+async def _run_in_pool(fn, *args):
+    stats = hash_pool_stats
+    slots = _get_slots()
+    stats.queued += 1
+    enqueued = time.perf_counter()
+    try:
+        await slots.acquire()
+    finally:
+        stats.queued -= 1
+
+    wait = time.perf_counter() - enqueued
+    stats.started += 1
+    stats.total_wait += wait
+    stats.max_wait = max(stats.max_wait, wait)
+    stats.in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        stats.in_flight -= 1
+        stats.completed += 1
+        slots.release()
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_pool(verify_password, plain_password, hashed_password)
+
+
+def shutdown_hash_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+metrics.Gauge(
+    "chatsphere_hash_queued", "Password hashes waiting for a pool slot.",
+    lambda: hash_pool_stats.queued,
+)
+metrics.Gauge(
+    "chatsphere_hash_in_flight", "Password hashes running in the pool.",
+    lambda: hash_pool_stats.in_flight,
+)
+metrics.CallbackCounter(
+    "chatsphere_hash_completed_total", "Password hashes completed.",
+    lambda: hash_pool_stats.completed,
+)
+metrics.Gauge(
+    "chatsphere_hash_max_wait_seconds", "Longest wait for a hash pool slot since startup.",
+    lambda: hash_pool_stats.max_wait,
+)
@@ -0,0 +1,31 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(obj: Any):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def dumps(obj: Any) -> str:
+        """Encode an event to a JSON text frame (orjson fast path)."""
+        return orjson.dumps(obj, default=_default).decode()
+
+else:
+
+    def dumps(obj: Any) -> str:
+        """Encode an event to a JSON text frame (stdlib fallback)."""
+        return json.dumps(obj, default=_default, separators=(",", ":"))
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A handler receives the channel name and the published payload.
+Handler = Callable[[str, dict], Awaitable[None]]
+
+# Backoff between attempts to re-establish a lost Redis subscription.
+RECONNECT_BACKOFF_INITIAL_SECONDS = 0.5
+RECONNECT_BACKOFF_MAX_SECONDS = 30.0
+
+
+class Backplane:
+    """
+    Pub/sub transport that sits behind ConnectionManager.broadcast().
+
+    Every process publishes room events to the backplane and only delivers
+    what it receives back to its own local sockets. Channels are plain strings
+    (e.g. "room:<room_id>") so other subsystems can share the same transport.
+    """
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, channel: str, handler: Handler):
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process backend: publish delivers straight to local handlers."""
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str):
+        self._handlers.pop(channel, None)
+
+    async def publish(self, channel: str, message: dict):
+        handler = self._handlers.get(channel)
+        if handler is not None:
+            await handler(channel, message)
+
+
+class LocalBroker:
+    """
+    In-memory stand-in for Redis/NATS. Several LocalBackplane instances
+    attached to the same broker behave like workers sharing a real broker,
+    which lets tests exercise cross-process fan-out in one interpreter.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set["LocalBackplane"]] = {}
+
+    def attach(self, channel: str, node: "LocalBackplane"):
+        self._subscribers.setdefault(channel, set()).add(node)
+
+    def detach(self, channel: str, node: "LocalBackplane"):
+        nodes = self._subscribers.get(channel)
+        if nodes is not None:
+            nodes.discard(node)
+            if not nodes:
+                del self._subscribers[channel]
+
+    async def publish(self, channel: str, message: dict):
+        # Round-trip through JSON so tests see the same payloads a real broker would.
+        wire = json.loads(json.dumps(message, default=str))
+        for node in list(self._subscribers.get(channel, ())):
+            await node._dispatch(channel, wire)
+
+
+class LocalBackplane(Backplane):
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+        self._handlers: Dict[str, Handler] = {}
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel] = handler
+        self.broker.attach(channel, self)
+
+    async def unsubscribe(self, channel: str):
+        self._handlers.pop(channel, None)
+        self.broker.detach(channel, self)
+
+    async def publish(self, channel: str, message: dict):
+        await self.broker.publish(channel, message)
+
+    async def _dispatch(self, channel: str, message: dict):
+        handler = self._handlers.get(channel)
+        if handler is not None:
+            await handler(channel, message)
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub backend. One connection is used for publishing and one
+    PubSub connection is shared by all channel subscriptions of this process.
+
+    If the subscription connection drops, the reader logs it and keeps
+    reconnecting with backoff, re-subscribing every channel once it is back.
+    Messages published in the gap are lost.
+    """
+
+    def __init__(self, url: str, prefix: str = "chatsphere:"):
+        self.url = url
+        self.prefix = prefix
+        self.node_id = uuid.uuid4().hex
+        self._redis = None
+        self._pubsub = None
+        self._reader: asyncio.Task | None = None
+        self._handlers: Dict[str, Handler] = {}
+
+    async def start(self):
+        if self._redis is not None:
+            return
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("WS_BACKPLANE=redis requires the 'redis' package") from e
+
+        self._redis = aioredis.from_url(self.url, decode_responses=True)
+        await self._open_pubsub()
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def _open_pubsub(self):
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        # A PubSub connection needs at least one subscription before listen() works.
+        channels = [self.prefix + "__node__:" + self.node_id]
+        channels += [self.prefix + channel for channel in self._handlers]
+        await self._pubsub.subscribe(*channels)
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def subscribe(self, channel: str, handler: Handler):
+        await self.start()
+        self._handlers[channel] = handler
+        await self._pubsub.subscribe(self.prefix + channel)
+
+    async def unsubscribe(self, channel: str):
+        self._handlers.pop(channel, None)
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.prefix + channel)
+
+    async def publish(self, channel: str, message: dict):
+        await self.start()
+        await self._redis.publish(self.prefix + channel, json.dumps(message, default=str))
+
+    async def _read_loop(self):
+        delay = RECONNECT_BACKOFF_INITIAL_SECONDS
+        while True:
+            try:
+                async for raw in self._pubsub.listen():
+                    delay = RECONNECT_BACKOFF_INITIAL_SECONDS
+                    await self._deliver(raw)
+                logger.error("Backplane subscription ended; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Backplane subscription lost; cross-worker events are missed until it is back")
+            await self._reconnect(delay)
+            delay = min(delay * 2, RECONNECT_BACKOFF_MAX_SECONDS)
+
+    async def _reconnect(self, delay: float):
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._pubsub.close()
+            except Exception:
+                pass
+            try:
+                await self._open_pubsub()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Backplane reconnect failed, retrying in %.1fs: %s", delay, e)
+                delay = min(delay * 2, RECONNECT_BACKOFF_MAX_SECONDS)
+                continue
+            logger.warning("Backplane subscription re-established (%d channels)", len(self._handlers))
+            return
+
+    async def _deliver(self, raw: dict):
+        channel = raw["channel"][len(self.prefix):]
+        handler = self._handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            await handler(channel, json.loads(raw["data"]))
+        except Exception:
+            logger.exception("Backplane handler failed for channel %s", channel)
+
+
+_backplane: Backplane | None = None
+
+
+def get_backplane() -> Backplane:
+    """Process-wide backplane shared by the connection manager and caches."""
+    global _backplane
+    if _backplane is None:
+        _backplane = create_backplane()
+    return _backplane
+
+
+def create_backplane() -> Backplane:
+    kind = (settings.WS_BACKPLANE or "memory").lower()
+    if kind == "memory":
+        return InMemoryBackplane()
+    if kind == "redis":
+        return RedisBackplane(settings.REDIS_URL)
+    if kind == "local":
+        return LocalBackplane(LocalBroker())
+    raise ValueError(f"Unknown WS_BACKPLANE '{settings.WS_BACKPLANE}'")
@@ -1,128 +1,406 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import time
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from typing import Dict, List
 
+from app.core import metrics
+from app.core.config import settings
 from app.utils.jwt import decode_token
-from app.services.chat_service import send_message, edit_message, remove_message, mark_msg_read # Import mark_msg_read
+from app.utils.serialization import dumps
+from app.schemas.chat_schema import ChatMessageInDB
+from app.services.chat_service import (
+    add_variants_listener,
+    edit_message,
+    mark_read,
+    remove_message,
+    send_message,
+)
+from app.services.read_receipts import read_receipts
+from app.services.room_cache import room_members
+from app.websocket.backplane import Backplane, get_backplane
+from app.websocket.connection import ClientConnection, coalesce_key_for
+from app.websocket.presence import PresenceTracker
+from app.websocket.typing import TokenBucket, TypingCoordinator
 
 router = APIRouter(tags=["WebSocket"])
 
+
+BROADCAST_FANOUT = metrics.Histogram(
+    "chatsphere_ws_broadcast_fanout", "Local sockets a room event was delivered to.",
+    buckets=metrics.FANOUT_BUCKETS,
+)
+BROADCAST_SECONDS = metrics.Histogram(
+    "chatsphere_ws_broadcast_seconds", "Time to enqueue a room event on every local socket."
+)
+
+
+def room_channel(room_id: str) -> str:
+    return f"room:{room_id}"
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    """
+    Local sockets indexed by room and by user.
+
+    A socket belongs to one user and can be subscribed to many rooms (the
+    multiplexed /ws endpoint), so a user in 30 rooms needs one socket, one
+    JWT decode and one outbound queue instead of 30.
+    """
+
+    def __init__(self, backplane: Backplane | None = None):
+        # room_id -> sockets on this worker subscribed to the room
+        self.active_connections: Dict[str, Dict[WebSocket, ClientConnection]] = {}
+        # user_id -> that user's sockets on this worker
+        self.user_connections: Dict[str, Dict[WebSocket, ClientConnection]] = {}
+        self.backplane = backplane or get_backplane()
+        self._listeners: List = []
+
+    def add_listener(self, listener):
+        """
+        Observe socket lifecycle (e.g. presence). Listeners implement
+        connection_opened(connection), connection_closed(connection) and
+        room_subscribed(connection, room_id); all are synchronous.
+        """
+        self._listeners.append(listener)
+
+    async def start(self):
+        await self.backplane.start()
 
-    async def connect(self, room_id: str, websocket: WebSocket):
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = []
-        self.active_connections[room_id].append(websocket)
+    async def stop(self):
+        for connections in list(self.user_connections.values()):
+            for connection in list(connections.values()):
+                await self.disconnect(connection)
+        await self.backplane.stop()
 
-    def disconnect(self, room_id: str, websocket: WebSocket):
-        if room_id in self.active_connections:
-            self.active_connections[room_id].remove(websocket)
+    def connect(self, websocket: WebSocket, user_id: str) -> ClientConnection:
+        async def prune(connection: ClientConnection):
+            await self.disconnect(connection)
+
+        connection = ClientConnection(websocket, user_id=user_id, on_close=prune)
+        connection.start()
+        self.user_connections.setdefault(user_id, {})[websocket] = connection
+        for listener in self._listeners:
+            listener.connection_opened(connection)
+        return connection
+
+    async def subscribe(self, connection: ClientConnection, room_id: str):
+        if connection.closed or room_id in connection.rooms:
+            return
+        connection.rooms.add(room_id)
+        connections = self.active_connections.get(room_id)
+        if connections is None:
+            connections = self.active_connections[room_id] = {}
+            # First local socket for this room: start receiving its events.
+            await self.backplane.subscribe(room_channel(room_id), self._on_room_event)
+        connections[connection.websocket] = connection
+        for listener in self._listeners:
+            listener.room_subscribed(connection, room_id)
+
+    async def unsubscribe(self, connection: ClientConnection, room_id: str):
+        connection.rooms.discard(room_id)
+        connections = self.active_connections.get(room_id)
+        if connections is None:
+            return
+        connections.pop(connection.websocket, None)
+        if not connections:
+            del self.active_connections[room_id]
+            await self.backplane.unsubscribe(room_channel(room_id))
+
+    async def disconnect(self, connection: ClientConnection):
+        for room_id in list(connection.rooms):
+            await self.unsubscribe(connection, room_id)
+        sockets = self.user_connections.get(connection.user_id)
+        registered = sockets is not None and sockets.pop(connection.websocket, None) is not None
+        if sockets is not None and not sockets:
+            del self.user_connections[connection.user_id]
+        await connection.close()
+        # Pruned sockets come through here twice (writer, then endpoint); report once.
+        if registered:
+            for listener in self._listeners:
+                listener.connection_closed(connection)
 
     async def broadcast(self, room_id: str, message: dict):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                await connection.send_json(message)
+        if "room_id" not in message:
+            # Multiplexed sockets tell rooms apart by this tag.
+            message = {**message, "room_id": room_id}
+        # Encode once here; every recipient gets the same text frame.
+        # Publish through the backplane; every process (including this one)
+        # delivers the event to its own local sockets in _on_room_event.
+        await self.backplane.publish(
+            room_channel(room_id),
+            {"frame": dumps(message), "key": coalesce_key_for(message)},
+        )
+
+    async def _on_room_event(self, channel: str, event: dict):
+        room_id = channel.split(":", 1)[1]
+        self.broadcast_local(room_id, event["frame"], event.get("key"))
+
+    def broadcast_local(self, room_id: str, frame: str, coalesce_key: str | None = None):
+        # O(1) enqueue per socket; writer tasks do the actual sends.
+        connections = self.active_connections.get(room_id)
+        if not connections:
+            return
+        if metrics.enabled:
+            start = time.perf_counter()
+        for connection in list(connections.values()):
+            connection.send(frame, coalesce_key)
+        if metrics.enabled:
+            BROADCAST_SECONDS.observe(time.perf_counter() - start)
+            BROADCAST_FANOUT.observe(len(connections))
 
 
 manager = ConnectionManager()
 
+metrics.Gauge(
+    "chatsphere_ws_connections", "Open WebSockets on this worker.",
+    lambda: sum(len(sockets) for sockets in manager.user_connections.values()),
+)
+metrics.Gauge(
+    "chatsphere_ws_rooms", "Rooms with at least one local subscriber.",
+    lambda: len(manager.active_connections),
+)
 
-@router.websocket("/ws/chat/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str):
 
-    await websocket.accept()
+async def broadcast_read_receipts(room_id: str, receipts: List[tuple]):
+    # One aggregated event per room per flush instead of one per message read.
+    await manager.broadcast(room_id, {
+        "type": "read_receipt",
+        "room_id": room_id,
+        "receipts": [
+            {"user_id": user_id, "last_read_message_id": message_id}
+            for user_id, message_id in receipts
+        ],
+    })
 
+
+async def broadcast_image_variants(msg: ChatMessageInDB):
+    # Follows a "create" that went out before its image's variants were rendered.
+    await manager.broadcast(msg.room_id, {
+        "type": "variants",
+        "id": msg.id,
+        "room_id": msg.room_id,
+        "image_variants": msg.image_variants,
+    })
+
+
+read_receipts.add_listener(broadcast_read_receipts)
+add_variants_listener(broadcast_image_variants)
+typing_coordinator = TypingCoordinator(manager)
+presence = PresenceTracker(manager)
+manager.add_listener(presence)
+
+PONG_FRAME = dumps({"type": "pong"})
+
+
+def _authenticate(websocket: WebSocket) -> str | None:
     token = websocket.query_params.get("token")
     if not token:
-        await websocket.close(code=1008)
-        return
-
+        return None
     payload = decode_token(token)
     if not payload or "sub" not in payload:
+        return None
+    return payload["sub"]
+
+
+async def _handle_action(connection: ClientConnection, room_id: str, data: dict, typing_limit: TokenBucket):
+    """Apply one client action to a room the connection's user is a member of."""
+    user_id = connection.user_id
+    action = data.get("type", "create")
+
+    if action == "create":
+        content = data.get("content")
+        image_url = data.get("image_url")
+        if not content and not image_url:
+            return
+
+        try:
+            msg = await send_message(room_id, user_id, content or "", image_url)
+        except HTTPException as e:
+            _send_status(connection, "error", room_id, e.detail)
+            return
+        await manager.broadcast(
+            room_id,
+            {
+                "type": "create",
+                "id": msg.id,
+                "room_id": msg.room_id,
+                "sender_id": msg.sender_id,
+                "content": msg.content,
+                "image_url": msg.image_url,
+                "image_variants": msg.image_variants,
+                "created_at": msg.created_at,
+                "updated_at": None,
+            },
+        )
+
+    elif action == "edit":
+        message_id = data.get("message_id")
+        new_content = data.get("content")
+        if message_id and new_content:
+            try:
+                updated_msg = await edit_message(message_id, user_id, new_content)
+            except HTTPException as e:
+                _send_status(connection, "error", room_id, e.detail)
+                return
+            if updated_msg:
+                # The message's own room, not whichever room the frame named.
+                await manager.broadcast(updated_msg.room_id, {
+                    "type": "edit",
+                    "id": updated_msg.id,
+                    "content": updated_msg.content,
+                    "updated_at": updated_msg.updated_at
+                })
+
+    elif action == "delete":
+        message_id = data.get("message_id")
+        if message_id:
+            try:
+                deleted_from = await remove_message(message_id, user_id)
+            except HTTPException as e:
+                _send_status(connection, "error", room_id, e.detail)
+                return
+            if deleted_from:
+                await manager.broadcast(deleted_from, {
+                    "type": "delete",
+                    "id": message_id
+                })
+
+    # --- Read watermark: "read up to" message_id (or the newest of message_ids) ---
+    elif action == "read":
+        message_ids = data["message_ids"] if "message_ids" in data else [data.get("message_id")]
+        if not _valid_message_ids(message_ids):
+            _send_status(connection, "error", room_id, "Invalid message_id(s)")
+            return
+        for message_id in message_ids:
+            mark_read(room_id, user_id, message_id)
+
+    # --- Typing: coalesced into periodic "typing_users" frames ---
+    elif action == "typing":
+        if typing_limit.allow():
+            await typing_coordinator.typing(room_id, user_id, data.get("username"))
+
+    elif action == "stop_typing":
+        await typing_coordinator.stop_typing(room_id, user_id)
+
+
+@router.websocket("/ws/chat/{room_id}")
+async def websocket_endpoint(websocket: WebSocket, room_id: str):
+    """One socket per room (kept for existing clients; see /ws for the multiplexed form)."""
+    await websocket.accept()
+
+    user_id = _authenticate(websocket)
+    if user_id is None or not await room_members.is_member(room_id, user_id):
         await websocket.close(code=1008)
         return
 
-    user_id = payload["sub"]
+    connection = manager.connect(websocket, user_id)
+    await manager.subscribe(connection, room_id)
+    typing_limit = TokenBucket(settings.TYPING_RATE_PER_SEC, settings.TYPING_BURST)
+
+    try:
+        while True:
+            data = await websocket.receive_json()
+            connection.touch()
+            if data.get("type") == "ping":
+                connection.send(PONG_FRAME)
+                continue
+
+            # Re-checked per action (a cache hit) so removal from a room takes effect immediately.
+            if not await room_members.is_member(room_id, user_id):
+                await websocket.close(code=1008)
+                break
+
+            await _handle_action(connection, room_id, data, typing_limit)
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Also covers sockets already pruned as dead or slow consumers.
+        await typing_coordinator.stop_typing(room_id, user_id)
+        await manager.disconnect(connection)
+
+
+def _valid_message_ids(message_ids) -> bool:
+    return (
+        isinstance(message_ids, list)
+        and bool(message_ids)
+        and all(isinstance(m, str) and ObjectId.is_valid(m) for m in message_ids)
+    )
 
-    await manager.connect(room_id, websocket)
+
+def _send_status(connection: ClientConnection, status: str, room_id: str | None, detail: str | None = None):
+    event = {"type": status, "room_id": room_id}
+    if detail:
+        event["detail"] = detail
+    connection.send(dumps(event))
+
+
+@router.websocket("/ws")
+async def multiplexed_endpoint(websocket: WebSocket):
+    """
+    One authenticated socket for all of a user's rooms.
+
+    Every client frame carries "room_id". {"type": "subscribe"} and
+    {"type": "unsubscribe"} manage the socket's rooms; any other action is
+    handled as on /ws/chat/{room_id} for a subscribed room. Every room
+    frame is tagged with the room it belongs to. {"type": "ping"} needs no
+    room and keeps the socket from being reaped as idle.
+    """
+    await websocket.accept()
+
+    user_id = _authenticate(websocket)
+    if user_id is None:
+        await websocket.close(code=1008)
+        return
+
+    connection = manager.connect(websocket, user_id)
+    typing_limit = TokenBucket(settings.TYPING_RATE_PER_SEC, settings.TYPING_BURST)
 
     try:
         while True:
             data = await websocket.receive_json()
-            
-            action = data.get("type", "create")
-            
-            if action == "create":
-                content = data.get("content")
-                image_url = data.get("image_url")
-                if not content and not image_url:
-                    continue
-
-                msg = await send_message(room_id, user_id, content or "", image_url)
-                await manager.broadcast(
-                    room_id,
-                    {
-                        "type": "create",
-                        "id": msg.id,
-                        "room_id": msg.room_id,
-                        "sender_id": msg.sender_id,
-                        "content": msg.content,
-                        "image_url": msg.image_url,
-                        "created_at": msg.created_at.isoformat(),
-                        "updated_at": None,
-                        "read_by": [] # New field
-                    },
-                )
-            
-            elif action == "edit":
-                message_id = data.get("message_id")
-                new_content = data.get("content")
-                if message_id and new_content:
-                    updated_msg = await edit_message(message_id, user_id, new_content)
-                    if updated_msg:
-                        await manager.broadcast(room_id, {
-                            "type": "edit",
-                            "id": updated_msg.id,
-                            "content": updated_msg.content,
-                            "updated_at": updated_msg.updated_at.isoformat() if updated_msg.updated_at else None
-                        })
-
-            elif action == "delete":
-                message_id = data.get("message_id")
-                if message_id:
-                    success = await remove_message(message_id, user_id)
-                    if success:
-                        await manager.broadcast(room_id, {
-                            "type": "delete",
-                            "id": message_id
-                        })
-            
-            # --- NEW: Handle Read Event ---
-            elif action == "read":
-                message_id = data.get("message_id")
-                if message_id:
-                    # Mark as read in DB
-                    await mark_msg_read(message_id, user_id)
-                    # Broadcast to room that THIS user read THIS message
-                    await manager.broadcast(room_id, {
-                        "type": "read_receipt",
-                        "message_id": message_id,
-                        "user_id": user_id
-                    })
-            
-            elif action == "typing":
-                await manager.broadcast(room_id, {
-                    "type": "typing",
-                    "user_id": user_id,
-                    "username": data.get("username")
-                })
-            
-            elif action == "stop_typing":
-                await manager.broadcast(room_id, {
-                    "type": "stop_typing",
-                    "user_id": user_id
-                })
+            connection.touch()
+            action = data.get("type")
+            if action == "ping":
+                connection.send(PONG_FRAME)
+                continue
+
+            room_id = data.get("room_id")
+            if not room_id:
+                _send_status(connection, "error", None, "room_id is required")
+                continue
+
+            if action == "subscribe":
+                if await room_members.is_member(room_id, user_id):
+                    await manager.subscribe(connection, room_id)
+                    _send_status(connection, "subscribed", room_id)
+                else:
+                    _send_status(connection, "error", room_id, "Not a participant of this room")
+                continue
+
+            if action == "unsubscribe":
+                await typing_coordinator.stop_typing(room_id, user_id)
+                await manager.unsubscribe(connection, room_id)
+                _send_status(connection, "unsubscribed", room_id)
+                continue
+
+            if room_id not in connection.rooms:
+                _send_status(connection, "error", room_id, "Not subscribed to this room")
+                continue
+
+            # Losing membership only drops this room; the socket stays up for the others.
+            if not await room_members.is_member(room_id, user_id):
+                await typing_coordinator.stop_typing(room_id, user_id)
+                await manager.unsubscribe(connection, room_id)
+                _send_status(connection, "error", room_id, "Not a participant of this room")
+                continue
+
+            await _handle_action(connection, room_id, data, typing_limit)
 
     except WebSocketDisconnect:
-        manager.disconnect(room_id, websocket)
\ No newline at end of file
+        pass
+    finally:
+        # Sockets pruned as slow consumers have no rooms left here; their typists expire by TTL.
+        for room_id in list(connection.rooms):
+            await typing_coordinator.stop_typing(room_id, user_id)
+        await manager.disconnect(connection)
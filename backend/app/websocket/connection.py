@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Close code sent to a consumer that cannot keep up ("Try Again Later").
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# Close code sent to a client that stopped sending heartbeats ("Going Away").
+IDLE_CLOSE_CODE = 1001
+
+
+def coalesce_key_for(message: dict) -> Optional[str]:
+    """
+    Events that only matter in their latest form share a key, so a queued
+    older copy can be replaced instead of sending both.
+    """
+    action = message.get("type")
+    if action == "typing_users":
+        return f"typing_users:{message.get('room_id')}"
+    if action == "edit":
+        return f"edit:{message.get('id')}"
+    return None
+
+
+class ClientConnection:
+    """
+    One WebSocket plus its bounded outbound queue. send() never awaits the
+    network; a dedicated writer task drains the queue so a slow client only
+    delays itself.
+
+    A connection belongs to one user and may be subscribed to any number of
+    rooms; ConnectionManager keeps `rooms` up to date.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str | None = None,
+        max_queue: int | None = None,
+        overflow_policy: str | None = None,
+        on_close: Callable[["ClientConnection"], Awaitable[None]] | None = None,
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.rooms: Set[str] = set()
+        # Last time the client sent anything; the presence reaper closes idle sockets.
+        self.last_seen = time.monotonic()
+        self.max_queue = max_queue or settings.WS_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or settings.WS_OVERFLOW_POLICY
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{self.overflow_policy}'")
+        self.on_close = on_close
+
+        # Entries are [coalesce_key, frame] so a coalesced update can swap
+        # the frame in place without moving it in the queue.
+        self._queue: Deque[List[Any]] = deque()
+        self._keyed: Dict[str, List[Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+        self._closer: asyncio.Task | None = None
+        self.closed = False
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def terminate(self, code: int):
+        """Close the socket from the server side; on_close runs once it is gone."""
+        self._schedule_close(code)
+
+    def start(self):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, frame: str, coalesce_key: str | None = None) -> bool:
+        """Queue a pre-encoded text frame. Returns False if the connection is gone."""
+        if self.closed:
+            return False
+
+        if coalesce_key is not None and self.overflow_policy == COALESCE:
+            entry = self._keyed.get(coalesce_key)
+            if entry is not None:
+                entry[1] = frame
+                self.coalesced += 1
+                return True
+
+        if len(self._queue) >= self.max_queue:
+            if self.overflow_policy == DISCONNECT:
+                self._schedule_close(SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            self._drop_oldest()
+
+        entry = [coalesce_key, frame]
+        self._queue.append(entry)
+        if coalesce_key is not None:
+            self._keyed[coalesce_key] = entry
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest(self):
+        entry = self._queue.popleft()
+        key = entry[0]
+        # Only forget the key if it still points at this entry, not a newer one.
+        if key is not None and self._keyed.get(key) is entry:
+            del self._keyed[key]
+        self.dropped += 1
+
+    def _pop(self):
+        entry = self._queue.popleft()
+        key = entry[0]
+        if key is not None and self._keyed.get(key) is entry:
+            del self._keyed[key]
+        return entry[1]
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame = self._pop()
+                await self.websocket.send_text(frame)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket died under us; prune it instead of failing the room.
+            logger.debug("WebSocket send failed, pruning connection", exc_info=True)
+            await self._finish()
+
+    def _schedule_close(self, code: int):
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._keyed.clear()
+        self._wakeup.set()
+        self._closer = asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+        await self._finish()
+
+    async def _finish(self):
+        self.closed = True
+        if self.on_close is not None:
+            callback, self.on_close = self.on_close, None
+            await callback(self)
+
+    async def close(self):
+        """Stop the writer. Pending messages are discarded."""
+        self.closed = True
+        self.on_close = None
+        self._queue.clear()
+        self._keyed.clear()
+        self._wakeup.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._writer = None
@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, FrozenSet, List, Set
+
+from app.core.config import settings
+from app.services.room_cache import room_members
+from app.services.user_cache import user_cache
+from app.utils.serialization import dumps
+from app.websocket.backplane import Backplane, get_backplane
+from app.websocket.connection import IDLE_CLOSE_CODE, ClientConnection
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_CHANNEL = "presence"
+
+
+class PresenceTracker:
+    """
+    Online/offline status for users, pushed as batched diffs.
+
+    Registered as a ConnectionManager listener: socket open/close only
+    adjusts a per-user local socket count. Once per tick this worker
+    publishes the users that went 0 -> 1 or 1 -> 0 sockets locally (one
+    backplane message), every worker folds those into user -> workers
+    sets, and users whose overall state flipped are sent as one
+    "presence" frame per local recipient: their friends and anyone
+    sharing a room with them. A reconnect inside one tick never shows up.
+
+    Workers heartbeat on the same channel; a worker that goes quiet for
+    PRESENCE_WORKER_TTL_SECONDS is treated as gone along with its users.
+    The same loop closes sockets that have sent nothing (not even a
+    "ping") for PRESENCE_IDLE_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, manager, backplane: Backplane | None = None):
+        self.manager = manager
+        self.backplane = backplane
+        self.worker_id = uuid.uuid4().hex
+        self.tick = settings.PRESENCE_TICK_MS / 1000
+        self.idle_timeout = settings.PRESENCE_IDLE_TIMEOUT_SECONDS
+        self.worker_ttl = settings.PRESENCE_WORKER_TTL_SECONDS
+
+        # This worker's sockets per user, and which users we've announced.
+        self._local: Dict[str, int] = {}
+        self._touched: Set[str] = set()
+        self._announced: Set[str] = set()
+        # Cluster view: user -> workers holding a socket for them, and back.
+        self._workers: Dict[str, Set[str]] = {}
+        self._worker_users: Dict[str, Set[str]] = {}
+        self._worker_seen: Dict[str, float] = {}
+        # Users whose cluster state may have flipped since the last fan-out,
+        # and the state local audiences were last told about.
+        self._changed: Set[str] = set()
+        self._reported: Set[str] = set()
+        # Friend lists of local users, and the inverse: who to tell about whom.
+        self._friends: Dict[str, FrozenSet[str]] = {}
+        self._followers: Dict[str, Set[str]] = {}
+        self._loading: Set[str] = set()
+
+        self._ticker: asyncio.Task | None = None
+        # Snapshot and friend-list loads in flight; cancelled on stop().
+        self._tasks: Set[asyncio.Task] = set()
+        self._last_heartbeat = 0.0
+        self._last_reap = 0.0
+        self._started = False
+
+        self.frames_sent = 0
+
+    async def start(self):
+        if self._started:
+            return
+        self.backplane = self.backplane or get_backplane()
+        await self.backplane.subscribe(PRESENCE_CHANNEL, self._on_event)
+        user_cache.add_listener(self._on_users_invalidated)
+        self._started = True
+        # Ask the other workers who they have online.
+        await self.backplane.publish(PRESENCE_CHANNEL, {"op": "hello", "worker": self.worker_id})
+        self._ticker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+        if self._started:
+            if self._announced:
+                await self.backplane.publish(PRESENCE_CHANNEL, {
+                    "op": "update", "worker": self.worker_id, "online": [], "offline": list(self._announced),
+                })
+                self._announced.clear()
+            await self.backplane.unsubscribe(PRESENCE_CHANNEL)
+            self._started = False
+
+    def is_online(self, user_id: str) -> bool:
+        return bool(self._workers.get(user_id))
+
+    # --- ConnectionManager listener ---
+
+    def connection_opened(self, connection: ClientConnection):
+        user_id = connection.user_id
+        count = self._local.get(user_id, 0)
+        self._local[user_id] = count + 1
+        self._touched.add(user_id)
+        if count == 0:
+            self._schedule_friend_load(user_id)
+        else:
+            self._send_snapshot([connection], self._friends.get(user_id, ()))
+
+    def connection_closed(self, connection: ClientConnection):
+        user_id = connection.user_id
+        count = self._local.get(user_id, 0) - 1
+        self._touched.add(user_id)
+        if count > 0:
+            self._local[user_id] = count
+            return
+        self._local.pop(user_id, None)
+        self._set_friends(user_id, frozenset())
+
+    def room_subscribed(self, connection: ClientConnection, room_id: str):
+        members = room_members.peek(room_id)
+        if members is None:
+            self._spawn(self._snapshot_room(connection, room_id))
+        elif members:
+            self._send_snapshot([connection], members)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _snapshot_room(self, connection: ClientConnection, room_id: str):
+        try:
+            members = await room_members.get_members(room_id)
+        except Exception:
+            logger.exception("Loading members for presence failed for room %s", room_id)
+            return
+        if room_id in connection.rooms:
+            self._send_snapshot([connection], members)
+
+    # --- friend lists ---
+
+    def _schedule_friend_load(self, user_id: str):
+        if user_id not in self._loading:
+            self._loading.add(user_id)
+            self._spawn(self._load_friends(user_id))
+
+    async def _load_friends(self, user_id: str):
+        try:
+            user = user_cache.get(user_id) or await user_cache.load(user_id)
+        except Exception:
+            logger.exception("Loading friends for presence failed for %s", user_id)
+            return
+        finally:
+            self._loading.discard(user_id)
+        if user is None or user_id not in self._local:
+            return
+        friends = frozenset(user.friends)
+        self._set_friends(user_id, friends)
+        self._send_snapshot(self.manager.user_connections.get(user_id, {}).values(), friends)
+
+    def _set_friends(self, user_id: str, friends: FrozenSet[str]):
+        old = self._friends.pop(user_id, frozenset())
+        for friend in old - friends:
+            followers = self._followers.get(friend)
+            if followers is not None:
+                followers.discard(user_id)
+                if not followers:
+                    del self._followers[friend]
+        for friend in friends - old:
+            self._followers.setdefault(friend, set()).add(user_id)
+        if friends:
+            self._friends[user_id] = friends
+
+    def _on_users_invalidated(self, user_ids: List[str]):
+        # Friend edges may have changed; refresh the lists we hold.
+        for user_id in user_ids:
+            if user_id in self._local:
+                self._schedule_friend_load(user_id)
+
+    # --- cluster state ---
+
+    async def _on_event(self, channel: str, event: dict):
+        op, worker = event.get("op"), event.get("worker")
+        self._worker_seen[worker] = time.monotonic()
+        if op == "hello" and worker != self.worker_id:
+            if self._announced:
+                await self.backplane.publish(PRESENCE_CHANNEL, {
+                    "op": "update", "worker": self.worker_id, "online": list(self._announced), "offline": [],
+                })
+        elif op == "update":
+            self._apply(worker, event.get("online", ()), event.get("offline", ()))
+
+    def _apply(self, worker: str, online, offline):
+        users = self._worker_users.setdefault(worker, set())
+        for user_id in online:
+            self._workers.setdefault(user_id, set()).add(worker)
+            users.add(user_id)
+            self._changed.add(user_id)
+        for user_id in offline:
+            workers = self._workers.get(user_id)
+            if workers is not None:
+                workers.discard(worker)
+                if not workers:
+                    del self._workers[user_id]
+            users.discard(user_id)
+            self._changed.add(user_id)
+        if not users:
+            del self._worker_users[worker]
+
+    def _expire_workers(self, now: float):
+        for worker, seen in list(self._worker_seen.items()):
+            if worker != self.worker_id and now - seen > self.worker_ttl:
+                del self._worker_seen[worker]
+                logger.warning("Presence: worker %s went silent, marking its users offline", worker)
+                self._apply(worker, (), list(self._worker_users.get(worker, ())))
+
+    # --- tick ---
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self._tick(time.monotonic())
+            except Exception:
+                logger.exception("Presence tick failed")
+
+    async def _tick(self, now: float):
+        await self._announce()
+        if now - self._last_heartbeat >= self.worker_ttl / 3:
+            self._last_heartbeat = now
+            await self.backplane.publish(PRESENCE_CHANNEL, {"op": "alive", "worker": self.worker_id})
+        self._expire_workers(now)
+        if self.idle_timeout and now - self._last_reap >= min(self.idle_timeout / 3, 5):
+            self._last_reap = now
+            self._reap_idle(now)
+        await self._fan_out()
+
+    async def _announce(self):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, set()
+        online = [u for u in touched if u in self._local and u not in self._announced]
+        offline = [u for u in touched if u not in self._local and u in self._announced]
+        if not online and not offline:
+            return  # reconnected within the tick
+        self._announced.update(online)
+        self._announced.difference_update(offline)
+        await self.backplane.publish(PRESENCE_CHANNEL, {
+            "op": "update", "worker": self.worker_id, "online": online, "offline": offline,
+        })
+
+    def _reap_idle(self, now: float):
+        for sockets in list(self.manager.user_connections.values()):
+            for connection in list(sockets.values()):
+                if now - connection.last_seen > self.idle_timeout:
+                    connection.terminate(IDLE_CLOSE_CODE)
+
+    async def _fan_out(self):
+        if not self._changed:
+            return
+        changed, self._changed = self._changed, set()
+        diffs: Dict[str, bool] = {}
+        for user_id in changed:
+            online = user_id in self._workers
+            if online != (user_id in self._reported):
+                diffs[user_id] = online
+                if online:
+                    self._reported.add(user_id)
+                else:
+                    self._reported.discard(user_id)
+        if not diffs:
+            return
+
+        flipped = set(diffs)
+        outbox: Dict[str, Set[str]] = {}
+        for user_id in flipped:
+            for follower in self._followers.get(user_id, ()):
+                outbox.setdefault(follower, set()).add(user_id)
+        for members, connections in await self._rooms_with_members():
+            hits = flipped & members
+            if not hits:
+                continue
+            for connection in connections.values():
+                outbox.setdefault(connection.user_id, set()).update(hits)
+
+        for recipient, user_ids in outbox.items():
+            user_ids.discard(recipient)
+            if not user_ids:
+                continue
+            frame = dumps({
+                "type": "presence",
+                "users": [{"user_id": u, "online": diffs[u]} for u in user_ids],
+            })
+            for connection in self.manager.user_connections.get(recipient, {}).values():
+                connection.send(frame)
+                self.frames_sent += 1
+
+    async def _rooms_with_members(self) -> List[tuple]:
+        """
+        (members, local sockets) for every room with local subscribers.
+
+        Pings don't touch the membership cache, so a quiet room's entry can
+        expire while its sockets stay open; those are reloaded here (one
+        query per room, shared with any concurrent authorization check).
+        """
+        rooms = list(self.manager.active_connections.items())
+        members = {room_id: room_members.peek(room_id) for room_id, _ in rooms}
+        missing = [room_id for room_id, cached in members.items() if cached is None]
+        if missing:
+            loaded = await asyncio.gather(
+                *(room_members.get_members(room_id) for room_id in missing), return_exceptions=True
+            )
+            for room_id, result in zip(missing, loaded):
+                if isinstance(result, BaseException):
+                    logger.warning("Loading members for presence failed for room %s: %s", room_id, result)
+                else:
+                    members[room_id] = result
+        return [(members[room_id], connections) for room_id, connections in rooms if members[room_id]]
+
+    def _send_snapshot(self, connections, user_ids):
+        """Current state of `user_ids` (online ones only) for freshly opened sockets/rooms."""
+        connections = list(connections)
+        if not connections:
+            return
+        online = [u for u in user_ids if u in self._workers and u != connections[0].user_id]
+        if not online:
+            return
+        frame = dumps({"type": "presence", "users": [{"user_id": u, "online": True} for u in online]})
+        for connection in connections:
+            connection.send(frame)
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Set, Tuple
+
+from app.core.config import settings
+from app.utils.serialization import dumps
+from app.websocket.backplane import Backplane, get_backplane
+from app.websocket.connection import coalesce_key_for
+
+logger = logging.getLogger(__name__)
+
+TYPING_CHANNEL = "typing"
+
+
+class TokenBucket:
+    """Per-connection rate limit: `rate` events per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int, timer: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.timer = timer
+        self.tokens = float(burst)
+        self.updated = timer()
+
+    def allow(self) -> bool:
+        now = self.timer()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class TypingCoordinator:
+    """
+    Server-side typing indicators.
+
+    Keystroke events only update per-room state. Every tick, rooms whose
+    set of typists changed get one aggregated "typing_users" frame; users
+    drop out automatically after `ttl` without a refresh, so a lost
+    "stop_typing" no longer leaves a stuck indicator.
+
+    State transitions (and periodic refreshes, at most every ttl/2) go over
+    the backplane so each worker knows about typists on other workers and
+    delivers the aggregated frame to its own sockets.
+    """
+
+    def __init__(self, manager, backplane: Backplane | None = None):
+        self.manager = manager
+        self.backplane = backplane
+        self.tick = settings.TYPING_TICK_MS / 1000
+        self.ttl = settings.TYPING_TTL_MS / 1000
+        # room_id -> user_id -> (username, expires_at)
+        self._rooms: Dict[str, Dict[str, Tuple[str | None, float]]] = {}
+        self._dirty: Set[str] = set()
+        # (room_id, user_id) -> when we last told the backplane
+        self._published: Dict[Tuple[str, str], float] = {}
+        self._ticker: asyncio.Task | None = None
+        self._started = False
+
+        self.frames_sent = 0
+
+    async def start(self):
+        if self._started:
+            return
+        self.backplane = self.backplane or get_backplane()
+        await self.backplane.subscribe(TYPING_CHANNEL, self._on_event)
+        self._started = True
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        if self._started:
+            await self.backplane.unsubscribe(TYPING_CHANNEL)
+            self._started = False
+
+    async def typing(self, room_id: str, user_id: str, username: str | None):
+        now = time.monotonic()
+        last = self._published.get((room_id, user_id))
+        if last is not None and now - last < self.ttl / 2:
+            # Still typing and others already know; just keep our own entry fresh.
+            self._set(room_id, user_id, username, now)
+            return
+        self._published[(room_id, user_id)] = now
+        await self._publish({"room_id": room_id, "user_id": user_id, "username": username, "typing": True})
+
+    async def stop_typing(self, room_id: str, user_id: str):
+        if self._published.pop((room_id, user_id), None) is None:
+            return
+        await self._publish({"room_id": room_id, "user_id": user_id, "typing": False})
+
+    async def _publish(self, event: dict):
+        if self._started:
+            await self.backplane.publish(TYPING_CHANNEL, event)
+        else:
+            await self._on_event(TYPING_CHANNEL, event)
+
+    async def _on_event(self, channel: str, event: dict):
+        room_id, user_id = event["room_id"], event["user_id"]
+        if event.get("typing"):
+            self._set(room_id, user_id, event.get("username"), time.monotonic())
+        else:
+            users = self._rooms.get(room_id)
+            if users is not None and users.pop(user_id, None) is not None:
+                self._dirty.add(room_id)
+
+    def _set(self, room_id: str, user_id: str, username: str | None, now: float):
+        users = self._rooms.setdefault(room_id, {})
+        if user_id not in users:
+            self._dirty.add(room_id)
+        users[user_id] = (username, now + self.ttl)
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._rooms or self._dirty:
+            await asyncio.sleep(self.tick)
+            try:
+                self._expire(time.monotonic())
+                self._flush()
+            except Exception:
+                logger.exception("Typing tick failed")
+
+    def _expire(self, now: float):
+        for room_id in list(self._rooms):
+            users = self._rooms[room_id]
+            for user_id, (_, expires_at) in list(users.items()):
+                if expires_at <= now:
+                    del users[user_id]
+                    self._published.pop((room_id, user_id), None)
+                    self._dirty.add(room_id)
+            if not users:
+                del self._rooms[room_id]
+
+    def _flush(self):
+        dirty, self._dirty = self._dirty, set()
+        for room_id in dirty:
+            connections = self.manager.active_connections.get(room_id)
+            if not connections:
+                continue
+            users = self._rooms.get(room_id, {})
+            event = {
+                "type": "typing_users",
+                "room_id": room_id,
+                "users": [{"user_id": uid, "username": name} for uid, (name, _) in users.items()],
+            }
+            # Local delivery only: every worker runs its own tick for its own sockets.
+            self.manager.broadcast_local(room_id, dumps(event), coalesce_key_for(event))
+            self.frames_sent += len(connections)
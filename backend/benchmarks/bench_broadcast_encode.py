@@ -0,0 +1,75 @@
+"""
+CPU cost of encoding one chat event for a room fan-out.
+
+  before: the event dict is handed to every socket and each send_json call
+          runs json.dumps again (what Starlette does per recipient).
+  after:  the event is encoded once with app.utils.serialization.dumps and
+          the same text frame goes to every recipient.
+
+Run from backend/:  python -m benchmarks.bench_broadcast_encode --recipients 500
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.utils import serialization
+
+
+def make_event() -> dict:
+    now = datetime.utcnow()
+    return {
+        "type": "create",
+        "id": str(ObjectId()),
+        "room_id": str(ObjectId()),
+        "sender_id": str(ObjectId()),
+        "content": "Hey everyone, the deploy finished and the dashboards look healthy. " * 2,
+        "image_url": None,
+        "created_at": now,
+        "updated_at": None,
+        "read_by": [],
+    }
+
+
+def fan_out_before(event: dict, recipients: int):
+    event = dict(event, created_at=event["created_at"].isoformat())
+    for _ in range(recipients):
+        json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+
+def fan_out_after(event: dict, recipients: int):
+    frame = serialization.dumps(event)
+    sink = []
+    for _ in range(recipients):
+        sink.append(frame)
+
+
+def measure(fn, event: dict, recipients: int, rounds: int) -> float:
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(event, recipients)
+    return (time.process_time() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    event = make_event()
+    before = measure(fan_out_before, event, args.recipients, args.rounds)
+    after = measure(fan_out_after, event, args.recipients, args.rounds)
+
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    print(f"recipients per fan-out: {args.recipients}  encoder: {encoder}")
+    print(f"before (encode per recipient): {before * 1e6:10.1f} us CPU / fan-out")
+    print(f"after  (encode once):          {after * 1e6:10.1f} us CPU / fan-out")
+    if after:
+        print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
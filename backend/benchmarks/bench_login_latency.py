@@ -0,0 +1,88 @@
+"""
+Event-loop responsiveness during a login burst.
+
+A "chat" task stands in for WebSocket traffic: every --tick-ms it wakes up
+and records how late it was scheduled, which is exactly the extra latency
+a message relayed on this worker would see. While it runs, --logins
+concurrent password verifications are fired:
+
+  inline: verify_password() called directly in the coroutine (old behaviour)
+  pooled: verify_password_async() through the bounded hashing pool
+
+Run from backend/:  python -m benchmarks.bench_login_latency --logins 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks import env  # noqa: F401  (settings defaults; before any app import)
+from app.utils.hashing import (
+    hash_password,
+    hash_pool_stats,
+    shutdown_hash_pool,
+    verify_password,
+    verify_password_async,
+)
+
+
+async def chat_ticker(tick: float, lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        expected = time.perf_counter() + tick
+        await asyncio.sleep(tick)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def inline_login(password: str, hashed: str):
+    await asyncio.sleep(0)
+    verify_password(password, hashed)
+
+
+async def pooled_login(password: str, hashed: str):
+    await verify_password_async(password, hashed)
+
+
+async def run(mode: str, logins: int, tick: float, hashed: str) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(chat_ticker(tick, lags, stop))
+    await asyncio.sleep(tick * 5)  # baseline samples
+
+    login = inline_login if mode == "inline" else pooled_login
+    started = time.perf_counter()
+    await asyncio.gather(*(login("correct horse battery", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    return {
+        "mode": mode,
+        "logins_per_sec": logins / elapsed,
+        "p50_ms": statistics.median(lags_ms),
+        "p99_ms": lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))],
+        "max_ms": lags_ms[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--tick-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    hashed = hash_password("correct horse battery")
+    print(f"{args.logins} concurrent logins, chat tick every {args.tick_ms} ms")
+    print(f"{'mode':<8}{'logins/s':>10}{'lag p50':>10}{'lag p99':>10}{'lag max':>10}")
+    for mode in ("inline", "pooled"):
+        result = asyncio.run(run(mode, args.logins, args.tick_ms / 1000, hashed))
+        print(
+            f"{result['mode']:<8}{result['logins_per_sec']:>10.1f}"
+            f"{result['p50_ms']:>8.1f}ms{result['p99_ms']:>8.1f}ms{result['max_ms']:>8.1f}ms"
+        )
+    print("pool stats:", hash_pool_stats.as_dict())
+    shutdown_hash_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Frames pushed to sockets by typing indicators in a busy room.
+
+  naive:     every keystroke is rebroadcast as its own "typing" frame to
+             every member (what the WebSocket endpoint used to do).
+  coalesced: keystrokes go through TypingCoordinator, which sends one
+             aggregated "typing_users" frame per room per tick, and only
+             when the set of typists changes.
+
+Run from backend/:  python -m benchmarks.bench_typing_fanout --members 200 --typists 10
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks import env  # noqa: F401  (settings defaults; before any app import)
+from app.websocket.typing import TokenBucket, TypingCoordinator
+
+
+class CountingManager:
+    """Stands in for ConnectionManager: counts frames instead of sending them."""
+
+    def __init__(self, room_id: str, members: int):
+        self.active_connections = {room_id: dict.fromkeys(range(members))}
+        self.frames = 0
+
+    def broadcast_local(self, room_id: str, frame: str, coalesce_key=None):
+        self.frames += len(self.active_connections.get(room_id, ()))
+
+
+async def simulate(members: int, typists: int, keys_per_sec: float, seconds: float) -> dict:
+    room_id = "bench-room"
+    manager = CountingManager(room_id, members)
+    coordinator = TypingCoordinator(manager)
+    buckets = [TokenBucket(5, 10) for _ in range(typists)]
+    naive_frames = 0
+    keystrokes = 0
+
+    interval = 1 / (keys_per_sec * typists)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        typist = random.randrange(typists)
+        keystrokes += 1
+        naive_frames += members
+        if buckets[typist].allow():
+            await coordinator.typing(room_id, f"user-{typist}", f"user {typist}")
+        await asyncio.sleep(interval)
+
+    for typist in range(typists):
+        await coordinator.stop_typing(room_id, f"user-{typist}")
+    await asyncio.sleep(coordinator.tick * 2)
+    await coordinator.stop()
+    return {"keystrokes": keystrokes, "naive": naive_frames, "coalesced": manager.frames}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--typists", type=int, default=10)
+    parser.add_argument("--keys-per-sec", type=float, default=6.0, help="keystrokes per second per typist")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    result = asyncio.run(simulate(args.members, args.typists, args.keys_per_sec, args.seconds))
+    print(f"{args.members} members, {args.typists} typing at {args.keys_per_sec}/s for {args.seconds}s "
+          f"({result['keystrokes']} keystrokes)")
+    print(f"naive:     {result['naive'] / args.seconds:10.0f} frames/s")
+    print(f"coalesced: {result['coalesced'] / args.seconds:10.0f} frames/s")
+    if result["coalesced"]:
+        print(f"reduction: {result['naive'] / result['coalesced']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
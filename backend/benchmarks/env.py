@@ -0,0 +1,20 @@
+"""
+Throwaway settings for running the benchmarks from a clean checkout.
+
+Settings are read when `app` is first imported, so import this module
+before anything from `app`. Values already in the environment (or .env)
+win.
+"""
+import os
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB_NAME", "chatsphere_bench")
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+os.environ.setdefault("CLOUDINARY_CLOUD_NAME", "bench")
+os.environ.setdefault("CLOUDINARY_API_KEY", "bench")
+os.environ.setdefault("CLOUDINARY_API_SECRET", "bench")
+os.environ.setdefault("STORAGE_BACKEND", "local")
+os.environ.setdefault("WS_BACKPLANE", "memory")
+# mongomock doesn't implement every index option; the hot paths don't need them.
+os.environ.setdefault("MONGO_ENSURE_INDEXES", "false")
+os.environ.setdefault("MONGO_RUN_MIGRATIONS", "false")
@@ -0,0 +1,349 @@
+"""
+End-to-end load harness: the real FastAPI app under uvicorn, backed by an
+in-memory Mongo (mongomock-motor), driven by many WebSocket and REST clients.
+
+Phases:
+  connect  --clients sockets on /ws/chat/{room_id}, spread over --rooms rooms
+  chat     --senders-per-room clients per room each send --messages messages;
+           every recipient measures send -> receive latency
+  rest     --requests GETs spread over the hot /chats and /users endpoints
+
+Reported per phase: p50/p99 latency, throughput, DB calls per operation
+(every Mongo collection call is counted) and, after connect, memory per
+connection. Server and clients share one process, so memory per connection
+includes the client-side socket objects too: an upper bound, but a stable
+one for spotting regressions.
+
+Needs the benchmark extras:  pip install mongomock-motor httpx websockets
+Run from backend/:  python -m benchmarks.load_harness --clients 2000 --rooms 20
+"""
+import argparse
+import asyncio
+import json
+import resource
+import socket
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+
+from bson import ObjectId
+
+# Settings are read at import time; point them at throwaway values first.
+from benchmarks import env  # noqa: F401
+
+DB_METHODS = {
+    "aggregate", "bulk_write", "count_documents", "create_index", "create_indexes",
+    "delete_many", "delete_one", "find", "find_one", "find_one_and_delete",
+    "find_one_and_update", "insert_many", "insert_one", "update_many", "update_one",
+}
+
+db_calls: Counter = Counter()
+
+
+class CountingCollection:
+    """Proxy that counts every query/write issued against a collection."""
+
+    def __init__(self, name: str, collection):
+        self._name = name
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in DB_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            db_calls[f"{self._name}.{name}"] += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+class CountingDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return CountingCollection(name, self._db[name])
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class CountingClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return CountingDatabase(self._client[name])
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def install_mock_database():
+    from mongomock_motor import AsyncMongoMockClient
+
+    from app.core import database
+
+    database._client = CountingClient(AsyncMongoMockClient())
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, needed), hard))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def seed(users: int, rooms: int):
+    """Users with a live session salt, and rooms with the users spread evenly over them."""
+    from app.core.database import get_database
+    from app.models.chat_model import insert_room
+    from app.models.user_model import USERS_COLLECTION
+    from app.utils.jwt import create_access_token
+
+    docs = []
+    for i in range(users):
+        docs.append({
+            "_id": ObjectId(),
+            "email": f"bench{i}@example.com",
+            "username": f"bench{i}",
+            "hashed_password": "x",
+            "friends": [],
+            "last_login_salt": str(ObjectId()),
+        })
+    await get_database()[USERS_COLLECTION].insert_many(docs)
+
+    members = [[] for _ in range(rooms)]
+    for i, doc in enumerate(docs):
+        members[i % rooms].append(str(doc["_id"]))
+    room_ids = []
+    for i, participants in enumerate(members):
+        room = await insert_room(f"bench-room-{i}", True, participants)
+        room_ids.append(room["id"])
+
+    clients = []
+    for i, doc in enumerate(docs):
+        token = create_access_token({"sub": str(doc["_id"]), "lid": doc["last_login_salt"]})
+        clients.append({"user_id": str(doc["_id"]), "room_id": room_ids[i % rooms], "token": token})
+    return clients
+
+
+class WsClient:
+    def __init__(self, info: dict):
+        self.info = info
+        self.ws = None
+        self.latencies: list = []
+        self.received = 0
+        self._reader: asyncio.Task | None = None
+
+    async def connect(self, base_url: str):
+        import websockets
+
+        url = f"{base_url}/ws/chat/{self.info['room_id']}?token={self.info['token']}"
+        self.ws = await websockets.connect(url, max_size=None, ping_interval=None)
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                event = json.loads(raw)
+                content = event.get("content") or ""
+                if event.get("type") == "create" and content.startswith("bench:"):
+                    self.latencies.append(time.perf_counter() - float(content.split(":", 2)[1]))
+                    self.received += 1
+        except Exception:
+            pass
+
+    async def send(self):
+        await self.ws.send(json.dumps({"type": "create", "content": f"bench:{time.perf_counter()!r}:x"}))
+
+    async def close(self):
+        await self.ws.close()
+        if self._reader is not None:
+            await self._reader
+
+
+async def phase_connect(clients, base_url: str, concurrency: int) -> dict:
+    db_calls.clear()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    gate = asyncio.Semaphore(concurrency)
+
+    async def open_one(client: WsClient):
+        async with gate:
+            await client.connect(base_url)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(open_one(c) for c in clients))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.5)  # let the server finish registering sockets
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "connects_per_sec": len(clients) / elapsed,
+        "bytes_per_connection": (after - before) / len(clients),
+        "db_calls_per_op": sum(db_calls.values()) / len(clients),
+        "db_calls": dict(db_calls),
+    }
+
+
+async def phase_chat(clients, rooms: int, senders_per_room: int, messages: int, interval: float) -> dict:
+    from app.core.config import settings
+
+    db_calls.clear()
+    by_room = {}
+    for client in clients:
+        by_room.setdefault(client.info["room_id"], []).append(client)
+    senders = [c for members in by_room.values() for c in members[:senders_per_room]]
+    expected = sum(len(by_room[s.info["room_id"]]) * messages for s in senders)
+
+    async def run_sender(client: WsClient):
+        for _ in range(messages):
+            await client.send()
+            await asyncio.sleep(interval)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_sender(s) for s in senders))
+    deadline = time.perf_counter() + 30
+    while sum(c.received for c in clients) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    # Write-behind batches land after the broadcast; count them too.
+    await asyncio.sleep(settings.MESSAGE_WRITE_FLUSH_MS / 1000 * 2)
+
+    latencies = [lat * 1000 for c in clients for lat in c.latencies]
+    sent = len(senders) * messages
+    return {
+        "sent": sent,
+        "delivered": len(latencies),
+        "expected": expected,
+        "sent_per_sec": sent / elapsed,
+        "delivered_per_sec": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) if latencies else float("nan"),
+        "p99_ms": percentile(latencies, 0.99) if latencies else float("nan"),
+        "db_calls_per_op": sum(db_calls.values()) / sent if sent else 0.0,
+        "db_calls": dict(db_calls),
+    }
+
+
+async def phase_rest(clients, http_url: str, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    db_calls.clear()
+    routes = [
+        lambda c: f"/chats/rooms/{c.info['room_id']}/messages?limit=50",
+        lambda c: "/chats/rooms/summary",
+        lambda c: "/users/me",
+        lambda c: "/users/friends",
+    ]
+    latencies = {i: [] for i in range(len(routes))}
+    failures = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=http_url, timeout=30) as http:
+        async def one(n: int):
+            nonlocal failures
+            client = clients[n % len(clients)]
+            route = n % len(routes)
+            async with gate:
+                started = time.perf_counter()
+                res = await http.get(routes[route](client), headers={"Authorization": f"Bearer {client.info['token']}"})
+                latencies[route].append((time.perf_counter() - started) * 1000)
+            if res.status_code != 200:
+                failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    per_route = {}
+    for i, samples in latencies.items():
+        name = routes[i](clients[0]).split("?")[0].replace(clients[0].info["room_id"], "{room_id}")
+        per_route[name] = {"p50_ms": statistics.median(samples), "p99_ms": percentile(samples, 0.99)}
+    return {
+        "requests_per_sec": requests / elapsed,
+        "failures": failures,
+        "routes": per_route,
+        "db_calls_per_op": sum(db_calls.values()) / requests,
+        "db_calls": dict(db_calls),
+    }
+
+
+def print_db_calls(calls: dict):
+    for name, count in sorted(calls.items(), key=lambda kv: -kv[1]):
+        print(f"    {name:<40}{count:>8}")
+
+
+async def run(args):
+    import uvicorn
+
+    install_mock_database()
+    from app.main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", ws_max_queue=1024))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        infos = await seed(args.clients, args.rooms)
+        clients = [WsClient(info) for info in infos]
+
+        connect = await phase_connect(clients, f"ws://127.0.0.1:{port}", args.concurrency)
+        print(f"connect: {args.clients} sockets over {args.rooms} rooms")
+        print(f"  {connect['connects_per_sec']:.0f} connects/s, "
+              f"{connect['bytes_per_connection'] / 1024:.1f} KiB/connection, "
+              f"{connect['db_calls_per_op']:.2f} DB calls/connect")
+        print_db_calls(connect["db_calls"])
+
+        chat = await phase_chat(clients, args.rooms, args.senders_per_room, args.messages, args.interval_ms / 1000)
+        print(f"chat: {chat['sent']} sent, {chat['delivered']}/{chat['expected']} delivered")
+        print(f"  {chat['sent_per_sec']:.0f} msgs/s in, {chat['delivered_per_sec']:.0f} frames/s out, "
+              f"latency p50 {chat['p50_ms']:.1f} ms p99 {chat['p99_ms']:.1f} ms, "
+              f"{chat['db_calls_per_op']:.2f} DB calls/message")
+        print_db_calls(chat["db_calls"])
+
+        rest = await phase_rest(clients, f"http://127.0.0.1:{port}", args.requests, args.concurrency)
+        print(f"rest: {args.requests} requests, {rest['requests_per_sec']:.0f} req/s, "
+              f"{rest['failures']} failures, {rest['db_calls_per_op']:.2f} DB calls/request")
+        for route, stats in rest["routes"].items():
+            print(f"    {route:<40} p50 {stats['p50_ms']:6.1f} ms  p99 {stats['p99_ms']:6.1f} ms")
+        print_db_calls(rest["db_calls"])
+
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--senders-per-room", type=int, default=2)
+    parser.add_argument("--messages", type=int, default=20, help="messages per sender")
+    parser.add_argument("--interval-ms", type=float, default=50.0, help="pause between a sender's messages")
+    parser.add_argument("--requests", type=int, default=2000, help="REST requests in the rest phase")
+    parser.add_argument("--concurrency", type=int, default=200, help="in-flight connects / REST requests")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients * 2 + 256)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
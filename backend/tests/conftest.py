@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+# Imported first: sets throwaway settings before the app reads them.
+from benchmarks.load_harness import CountingClient, db_calls  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from app.core import database  # noqa: E402
+from app.services import chat_service  # noqa: E402
+from app.services.message_cache import message_cache  # noqa: E402
+from app.services.room_cache import room_members  # noqa: E402
+from app.services.user_cache import user_cache  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database behind the harness's call counter, and cold caches."""
+    database._client = CountingClient(AsyncMongoMockClient())
+    for cache in (room_members._cache, user_cache._cache, chat_service._direct_rooms):
+        cache.clear()
+    for room_id in list(message_cache._rooms):
+        message_cache.invalidate(room_id)
+    db_calls.clear()
+    yield db_calls
+    database._client = None
+
+
+@pytest.fixture
+def run():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def count(db, run):
+    """Run a coroutine and return (result, {"collection.method": calls}) for just that call."""
+
+    def counted(coro):
+        db.clear()
+        result = run(coro)
+        return result, dict(db)
+
+    return counted
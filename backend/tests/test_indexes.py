@@ -0,0 +1,36 @@
+"""
+The declared indexes cover every hot query verify_query_plans() explains.
+
+mongomock has no query planner, so this checks the INDEXES spec itself:
+some index on the collection leads with a filtered field, contains every
+filtered and sorted field, and walks the sort in its order (or reversed).
+`python -m app.core.indexes --verify` checks the real plans against Mongo.
+"""
+import pytest
+from pymongo import TEXT
+
+from app.core.indexes import INDEXES, _hot_queries
+
+
+def _covers(key: list, query: dict) -> bool:
+    names = [name for name, _ in key]
+    if "$text" in query["filter"]:
+        return any(direction == TEXT for _, direction in key)
+    filtered = list(query["filter"])
+    sort = query.get("sort", [])
+    if names[0] not in filtered or not set(filtered) | {n for n, _ in sort} <= set(names):
+        return False
+    if not sort:
+        return True
+    directions = dict(key)
+    if [names.index(n) for n, _ in sort] != sorted(names.index(n) for n, _ in sort):
+        return False
+    same = all(directions[n] == d for n, d in sort)
+    reversed_ = all(directions[n] == -d for n, d in sort)
+    return same or reversed_
+
+
+@pytest.mark.parametrize("query", _hot_queries(), ids=lambda q: q["name"])
+def test_hot_query_has_an_index(query):
+    keys = [list(index.document["key"].items()) for index in INDEXES[query["collection"]]]
+    assert any(_covers(key, query) for key in keys), f"no index serves {query['name']}"
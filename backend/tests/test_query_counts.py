@@ -0,0 +1,126 @@
+"""
+Round trips per service call, counted at the Motor collection API.
+
+Guards the single-round-trip model helpers: a write never re-reads what it
+just wrote, and ownership checks ride along in the update/delete filter.
+"""
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.schemas.chat_schema import ChatRoomCreate
+from app.schemas.user_schema import UserCreate, UserLogin
+from app.services import auth_service, chat_service
+
+ALICE = UserCreate(email="alice@example.com", username="alice", password="correct-horse")
+
+
+def new_id() -> str:
+    return str(ObjectId())
+
+
+@pytest.fixture
+def room(run, db):
+    return run(chat_service.create_chat_room(
+        ChatRoomCreate(name="general", is_group=True, participants=[new_id(), new_id()])
+    ))
+
+
+@pytest.fixture
+def message(run, room):
+    return run(chat_service.send_message(room.id, room.participants[0], "hello", durable=True))
+
+
+# --- auth_service ---
+
+def test_register_user_checks_email_then_inserts(count):
+    user, calls = count(auth_service.register_user(ALICE))
+    assert user.email == ALICE.email
+    assert calls == {"users.find_one": 1, "users.insert_one": 1}
+
+
+def test_login_user_reads_then_rotates_salt(count, run):
+    run(auth_service.register_user(ALICE))
+    token, calls = count(auth_service.login_user(UserLogin(email=ALICE.email, password=ALICE.password)))
+    assert token.access_token
+    assert calls == {"users.find_one": 1, "users.find_one_and_update": 1}
+
+
+# --- chat_service: rooms ---
+
+def test_create_chat_room_does_not_reread(count):
+    participants = [new_id(), new_id()]
+    room, calls = count(chat_service.create_chat_room(
+        ChatRoomCreate(name="general", is_group=True, participants=participants)
+    ))
+    assert room.participants == participants
+    assert calls == {"chat_rooms.insert_one": 1, "room_reads.bulk_write": 1}
+
+
+def test_direct_room_is_one_upsert_then_cached(count):
+    a, b = new_id(), new_id()
+    first, calls = count(chat_service.get_or_create_direct_room(a, b))
+    assert calls == {"chat_rooms.find_one_and_update": 1, "room_reads.bulk_write": 1}
+
+    again, calls = count(chat_service.get_or_create_direct_room(b, a))
+    assert again.id == first.id
+    assert calls == {}
+
+
+def test_room_listings(count, room):
+    user = room.participants[0]
+    _, calls = count(chat_service.get_user_rooms(user, 100))
+    assert calls == {"chat_rooms.find": 1}
+
+    _, calls = count(chat_service.get_room_summaries(user, 100))
+    assert calls == {"chat_rooms.find": 1, "room_reads.find": 1}
+
+
+# --- chat_service: messages ---
+
+def test_send_message_is_one_insert_plus_room_activity(count, room):
+    msg, calls = count(chat_service.send_message(room.id, room.participants[0], "hello", durable=True))
+    assert msg.content == "hello"
+    assert calls == {
+        "chat_messages.insert_many": 1,
+        "chat_rooms.bulk_write": 1,
+        "room_reads.bulk_write": 1,
+    }
+
+
+def test_get_messages_reads_once_then_serves_from_cache(count, room, message):
+    page, calls = count(chat_service.get_messages(room.id))
+    assert [m.id for m in page] == [message.id]
+    assert calls == {"chat_messages.find": 1}
+
+    page, calls = count(chat_service.get_messages(room.id))
+    assert [m.id for m in page] == [message.id]
+    assert calls == {}
+
+
+def test_edit_message_by_author_is_one_update(count, room, message):
+    edited, calls = count(chat_service.edit_message(message.id, room.participants[0], "edited"))
+    assert edited.content == "edited"
+    assert calls == {"chat_messages.find_one_and_update": 1, "chat_rooms.update_one": 1}
+
+
+def test_edit_message_by_someone_else_looks_up_once_for_403(db, run, room, message):
+    db.clear()
+    with pytest.raises(HTTPException) as exc:
+        run(chat_service.edit_message(message.id, room.participants[1], "hijacked"))
+    assert exc.value.status_code == 403
+    assert dict(db) == {"chat_messages.find_one_and_update": 1, "chat_messages.find_one": 1}
+
+
+def test_remove_message_by_author(count, room, message):
+    removed, calls = count(chat_service.remove_message(message.id, room.participants[0]))
+    assert removed == room.id
+    # Deleting the room's newest message also moves its preview back one message.
+    assert calls == {
+        "chat_messages.find_one_and_delete": 1,
+        "room_reads.update_many": 1,
+        "chat_rooms.find_one": 1,
+        "chat_messages.find_one": 1,
+        "chat_rooms.update_one": 1,
+    }
+
@@ -0,0 +1,44 @@
+import asyncio
+
+from bson import ObjectId
+
+from app.schemas.chat_schema import ChatRoomCreate
+from app.services import chat_service, read_receipts as read_receipts_module
+from app.services.read_receipts import ReadReceiptAggregator
+
+
+def test_read_marked_during_flush_gets_its_own_flush(run, db, monkeypatch):
+    alice, bob = str(ObjectId()), str(ObjectId())
+    aggregator = ReadReceiptAggregator(flush_interval=0.01)
+    received = []
+
+    async def listener(room_id, receipts):
+        received.extend(receipts)
+
+    aggregator.add_listener(listener)
+
+    async def noop(watermarks):
+        pass
+
+    async def scenario():
+        room = await chat_service.create_chat_room(
+            ChatRoomCreate(name="general", is_group=True, participants=[alice, bob])
+        )
+        first = await chat_service.send_message(room.id, alice, "one", durable=True)
+        second = await chat_service.send_message(room.id, alice, "two", durable=True)
+
+        async def mark_mid_flush(watermarks):
+            # Bob reads while Alice's watermark is being written. (The write
+            # itself is skipped: mongomock can't $max against a null field.)
+            if not received:
+                aggregator.mark_read(room.id, bob, second.id)
+
+        monkeypatch.setattr(read_receipts_module, "advance_read_watermarks", mark_mid_flush)
+        monkeypatch.setattr(read_receipts_module, "refresh_unread_counts", noop)
+        aggregator.mark_read(room.id, alice, first.id)
+        await asyncio.sleep(0.2)
+        return first, second
+
+    first, second = run(scenario())
+    assert aggregator._pending == {}
+    assert sorted(received) == sorted([(alice, first.id), (bob, second.id)])
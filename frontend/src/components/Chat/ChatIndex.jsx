@@ -18,6 +18,21 @@ const formatIndianTime = (dateString) => {
   });
 };
 
+// Message ids are ObjectId hex strings, which sort by creation time, so a
+// "read up to" watermark covers every message with an id <= it.
+const applyReadWatermarks = (messages, receipts) => {
+  if (!receipts || receipts.length === 0) return messages;
+  return messages.map(msg => {
+    let readBy = msg.read_by || [];
+    receipts.forEach(({ user_id, last_read_message_id }) => {
+      if (user_id !== msg.sender_id && msg.id <= last_read_message_id && !readBy.includes(user_id)) {
+        readBy = [...readBy, user_id];
+      }
+    });
+    return readBy === msg.read_by ? msg : { ...msg, read_by: readBy };
+  });
+};
+
 const ChatIndex = () => {
   const { user, token, logout } = useContext(AuthContext);
   
@@ -40,6 +55,7 @@ const ChatIndex = () => {
 
   const [ws, setWs] = useState(null);
   const [typingUsers, setTypingUsers] = useState([]); 
+  const [onlineUserIds, setOnlineUserIds] = useState(() => new Set());
   const [searchQuery, setSearchQuery] = useState('');
   const [searchResults, setSearchResults] = useState([]);
   const [selectedFile, setSelectedFile] = useState(null);
@@ -57,15 +73,9 @@ const ChatIndex = () => {
 
   const fetchFriends = async () => {
     try {
-      const res = await api.get('/users/friends'); 
-      const friendIds = res.data; 
-      if (friendIds.length > 0) {
-        const allUsersRes = await api.get('/users/');
-        const friendObjects = allUsersRes.data.filter(u => friendIds.includes(u.id));
-        setFriends(friendObjects);
-      } else {
-        setFriends([]);
-      }
+      // Hydrated profiles in one request
+      const res = await api.get('/users/friends');
+      setFriends(res.data);
     } catch (err) {
       console.error("Failed to fetch friends", err);
     }
@@ -178,8 +188,11 @@ const ChatIndex = () => {
     if (!activeRoom) return;
 
     const fetchHistory = async () => {
-      const res = await api.get(`/chats/rooms/${activeRoom.id}/messages?limit=50`);
-      setMessages(res.data);
+      const [res, readsRes] = await Promise.all([
+        api.get(`/chats/rooms/${activeRoom.id}/messages?limit=50`),
+        api.get(`/chats/rooms/${activeRoom.id}/reads`),
+      ]);
+      setMessages(applyReadWatermarks(res.data, readsRes.data));
     };
 
     fetchHistory();
@@ -201,37 +214,38 @@ const ChatIndex = () => {
           setMessages((prev) => prev.filter(msg => msg.id !== data.id));
       }
       // --- Typing ---
-      else if (data.type === "typing") {
-          if (data.user_id !== user.id) {
-              setTypingUsers((prev) => {
-                  if (!prev.some(u => u.id === data.user_id)) {
-                      return [...prev, { id: data.user_id, username: data.username }];
-                  }
-                  return prev;
-              });
-          }
-      }
-      else if (data.type === "stop_typing") {
-          setTypingUsers((prev) => prev.filter(u => u.id !== data.user_id));
+      // The server sends the full set of typists whenever it changes
+      else if (data.type === "typing_users") {
+          setTypingUsers(
+              (data.users || [])
+                  .filter(u => u.user_id !== user.id)
+                  .map(u => ({ id: u.user_id, username: u.username }))
+          );
       }
       // --- Read Receipt ---
       else if (data.type === "read_receipt") {
-          setMessages((prev) => prev.map(msg => {
-              if (msg.id === data.message_id) {
-                  const currentReads = msg.read_by || [];
-                  if(!currentReads.includes(data.user_id)) {
-                      return { ...msg, read_by: [...currentReads, data.user_id] };
-                  }
-              }
-              return msg;
-          }));
+          setMessages((prev) => applyReadWatermarks(prev, data.receipts || []));
+      }
+      // --- Presence: batched online/offline diffs ---
+      else if (data.type === "presence") {
+          setOnlineUserIds((prev) => {
+              const next = new Set(prev);
+              (data.users || []).forEach(u => u.online ? next.add(u.user_id) : next.delete(u.user_id));
+              return next;
+          });
       }
     };
     
+    // Heartbeat so the server doesn't reap this socket as idle
+    const heartbeat = setInterval(() => {
+        if (socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify({ type: "ping" }));
+    }, 25000);
+
     socket.onclose = () => console.log("WS Disconnected");
     setWs(socket);
 
     return () => {
+        clearInterval(heartbeat);
         socket.close();
         setTypingUsers([]);
     };
@@ -241,23 +255,15 @@ const ChatIndex = () => {
   useEffect(() => {
       if(!activeRoom || !ws || messages.length === 0) return;
 
-      messages.forEach(msg => {
-          if (msg.sender_id !== user.id) {
-              const reads = msg.read_by || [];
-              if (!reads.includes(user.id)) {
-                  ws.send(JSON.stringify({
-                      type: "read",
-                      message_id: msg.id
-                  }));
-                  
-                  setMessages(prev => prev.map(m => 
-                      m.id === msg.id 
-                      ? { ...m, read_by: [...(m.read_by || []), user.id] } 
-                      : m
-                  ));
-              }
-          }
-      });
+      // One "read up to" watermark for the newest unread message from someone else
+      const unread = messages.filter(
+          msg => msg.sender_id !== user.id && !(msg.read_by || []).includes(user.id)
+      );
+      if (unread.length === 0) return;
+
+      const newest = unread[unread.length - 1];
+      ws.send(JSON.stringify({ type: "read", message_id: newest.id }));
+      setMessages(prev => applyReadWatermarks(prev, [{ user_id: user.id, last_read_message_id: newest.id }]));
   }, [messages, activeRoom, ws, user.id]);
 
 
@@ -360,6 +366,7 @@ const ChatIndex = () => {
             selectedGroup={selectedGroup}
             onSelectFriend={handleSelectFriend}
             onSelectGroup={handleSelectGroup}
+            onlineUserIds={onlineUserIds}
           />
 
           {/* Chat Area */}
@@ -1,7 +1,7 @@
 import React from 'react';
 import { Col, ListGroup } from 'react-bootstrap';
 
-const Sidebar = ({ friends, groups, selectedFriend, selectedGroup, onSelectFriend, onSelectGroup }) => {
+const Sidebar = ({ friends, groups, selectedFriend, selectedGroup, onSelectFriend, onSelectGroup, onlineUserIds = new Set() }) => {
   return (
     <Col md={3} className="border-end p-0 bg-light d-flex flex-column h-100">
       <div className="flex-grow-1 overflow-auto">
@@ -36,6 +36,9 @@ const Sidebar = ({ friends, groups, selectedFriend, selectedGroup, onSelectFrien
                           className="border-0 rounded mb-1 py-2"
                       >
                           {friend.username}
+                          {onlineUserIds.has(friend.id) && (
+                              <span className="ms-2 d-inline-block rounded-circle bg-success" style={{ width: 8, height: 8 }} title="Online" />
+                          )}
                       </ListGroup.Item>
                   ))}
               </ListGroup>